@@ -3,15 +3,27 @@ import json
 import git
 import importlib
 import warnings
-from tree_sitter import Language, Parser
+from tree_sitter import Language, Parser, Query, QueryCursor
 import time
-import shutil
 import uuid
+import random
+import hashlib
+import asyncio
+import multiprocessing
+import mmap
+import functools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel, Field
 from typing import List, Dict
 
+from llm_cache import cached_ainvoke
+from llm_limits import LLM_CONCURRENCY, llm_slot
+from repo_cache import get_repo_cache
+
 # --- Pydantic Models for Enrichment ---
 class FunctionInput(BaseModel):
     name: str
@@ -52,41 +64,185 @@ LANGUAGE_CONFIG = {
     }
 }
 
+# Per-language tree-sitter queries (queries/<grammar_name>.scm). A language with a query
+# file is extracted by the query engine; the node-type fields above are only used as a
+# fallback for languages without one. Captures: @function (definition node),
+# @function.name (its name), @call (call node) and @call.name (the called identifier).
+QUERY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'queries')
+
+def load_query(language_object, grammar_name):
+    query_path = os.path.join(QUERY_DIR, f"{grammar_name}.scm")
+    if not os.path.exists(query_path):
+        return None
+    with open(query_path, 'r', encoding='utf-8') as f:
+        return Query(language_object, f.read())
+
 class MultiLanguageParser:
-    def __init__(self, config):
+    """Grammar registry. A language is loaded the first time one of its extensions is
+    asked for, then kept for the life of the object (failures too, so they are reported
+    once). tree-sitter Parsers are not thread-safe, so each thread gets its own Parser
+    per language; Language objects and queries are shared.
+    """
+    def __init__(self, config, quiet=False):
         self.config = config
-        self.extension_map = {}
+        self.quiet = quiet
+        self.extension_map = {f".{ext}": lang for lang, conf in config.items() for ext in conf['extensions']}
+        self._languages = {}  # lang -> (language_object, conf), or None if it failed to load
+        self._lock = threading.Lock()
+        self._local = threading.local()
 
-    def load_languages(self):
-        print("Loading languages from installed packages...")
-        for lang, conf in self.config.items():
-            lang_name = conf['grammar_name']
-            package_name = f"tree_sitter_{lang_name}"
-            try:
-                lang_module = importlib.import_module(package_name)
-                language_func = getattr(lang_module, 'language')
-                language_capsule = language_func()
-                language_object = Language(language_capsule)
-                parser = Parser(language_object)
-                
-                parser_tuple = (parser, language_object, conf)
-                for ext in conf['extensions']:
-                    self.extension_map[f".{ext}"] = parser_tuple
+    def load_languages(self, quiet=None):
+        """Load every configured grammar now instead of on first use."""
+        for lang in self.config:
+            self._language(lang, quiet)
+
+    def _language(self, lang, quiet=None):
+        loaded = self._languages.get(lang, False)
+        if loaded is not False:
+            return loaded
+        with self._lock:
+            if lang not in self._languages:
+                self._languages[lang] = self._load_language(lang, self.quiet if quiet is None else quiet)
+            return self._languages[lang]
+
+    def _load_language(self, lang, quiet):
+        conf = self.config[lang]
+        lang_name = conf['grammar_name']
+        package_name = f"tree_sitter_{lang_name}"
+        try:
+            lang_module = importlib.import_module(package_name)
+            language_func = getattr(lang_module, 'language')
+            language_capsule = language_func()
+            language_object = Language(language_capsule)
+            query = load_query(language_object, lang_name)
+            if query is not None:
+                conf = dict(conf, query=query)
+            if not quiet:
                 print(f"  Successfully loaded '{lang_name}' (from {package_name})")
-            except ImportError:
-                print(f" WARNING: Failed to import '{package_name}'.")
-                print(f" Did you run: pip install {package_name.replace('_', '-')}")
-            except Exception as e:
-                print(f" ERROR: Failed to load '{lang_name}': {e}")
+            return language_object, conf
+        except ImportError:
+            print(f" WARNING: Failed to import '{package_name}'.")
+            print(f" Did you run: pip install {package_name.replace('_', '-')}")
+        except Exception as e:
+            print(f" ERROR: Failed to load '{lang_name}': {e}")
+        return None
 
     def get_parser(self, file_extension):
-        return self.extension_map.get(file_extension)
+        """(parser, language_object, config) for this thread, or None if unsupported."""
+        lang = self.extension_map.get(file_extension)
+        if lang is None:
+            return None
+        parsers = getattr(self._local, 'parsers', None)
+        if parsers is None:
+            parsers = self._local.parsers = {}
+        parser_tuple = parsers.get(lang)
+        if parser_tuple is None:
+            loaded = self._language(lang)
+            if loaded is None:
+                return None
+            language_object, conf = loaded
+            parser_tuple = parsers[lang] = (Parser(language_object), language_object, conf)
+        return parser_tuple
+
+_parser_registry = None
+_parser_registry_lock = threading.Lock()
+
+def get_parser_registry() -> MultiLanguageParser:
+    """Process-wide grammar registry, shared by every skeleton build in this process."""
+    global _parser_registry
+    with _parser_registry_lock:
+        if _parser_registry is None:
+            _parser_registry = MultiLanguageParser(LANGUAGE_CONFIG)
+        return _parser_registry
+
+def collect_functions(root, func_node_types, call_node_type, call_function_field):
+    """Single iterative pre-order walk with a TreeCursor.
+
+    Returns (function_node, calls) for every node whose type is in `func_node_types`,
+    ordered by type (in `func_node_types` order) and then by position, i.e. the order
+    the per-type traversals used to produce. `calls` holds the names of every call
+    inside the function, nested functions included.
+    """
+    type_rank = {t: i for i, t in enumerate(func_node_types)}
+    found = []
+    open_functions = []  # (depth, calls) for functions enclosing the current node
+    cursor = root.walk()
+    depth = 0
+    while True:
+        node = cursor.node
+        while open_functions and open_functions[-1][0] >= depth:
+            open_functions.pop()
 
-def traverse_tree(node, node_type):
-    if node.type == node_type:
-        yield node
-    for child in node.children:
-        yield from traverse_tree(child, node_type)
+        node_type = node.type
+        if node_type == call_node_type and open_functions:
+            call_name = get_call_name(node, call_function_field)
+            if call_name:
+                for _, calls in open_functions:
+                    calls.append(call_name)
+        rank = type_rank.get(node_type)
+        if rank is not None:
+            calls = []
+            found.append((rank, len(found), node, calls))
+            open_functions.append((depth, calls))
+
+        if cursor.goto_first_child():
+            depth += 1
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                found.sort(key=lambda item: (item[0], item[1]))
+                return [(func_node, calls) for _, _, func_node, calls in found]
+            depth -= 1
+
+def collect_functions_query(root, query):
+    """Run a precompiled extraction query over the tree; matching happens in C.
+
+    Returns (function_node, name, calls) in the order collect_functions uses: by
+    definition pattern, then by position. A definition matched more than once (e.g. an
+    arrow function with several identifier children) keeps the first name in the source.
+    Calls are attributed to every enclosing function with one sweep over byte ranges.
+    """
+    definitions = {}  # (start_byte, end_byte) -> [pattern_index, func_node, name_node]
+    call_nodes = []
+    for pattern_index, captures in QueryCursor(query).matches(root):
+        call = captures.get('call')
+        if call:
+            call_nodes.append((call[0].start_byte, -call[0].end_byte, captures['call.name'][0]))
+            continue
+        func, name = captures.get('function'), captures.get('function.name')
+        if not func or not name:
+            continue
+        key = (func[0].start_byte, func[0].end_byte)
+        entry = definitions.get(key)
+        if entry is None:
+            definitions[key] = [pattern_index, func[0], name[0]]
+        elif name[0].start_byte < entry[2].start_byte:
+            entry[2] = name[0]
+
+    # Outer functions before the functions they contain
+    spans = sorted(definitions.items(), key=lambda item: (item[0][0], -item[0][1]))
+    calls_by_key = {key: [] for key, _ in spans}
+    call_nodes.sort(key=lambda item: item[:2])  # pre-order: outer calls first
+    open_functions = []  # (end_byte, calls) for functions enclosing the current call
+    next_span = 0
+    for position, _, name_node in call_nodes:
+        while next_span < len(spans) and spans[next_span][0][0] <= position:
+            (start, end), _ = spans[next_span]
+            while open_functions and open_functions[-1][0] <= start:
+                open_functions.pop()
+            open_functions.append((end, calls_by_key[(start, end)]))
+            next_span += 1
+        while open_functions and open_functions[-1][0] <= position:
+            open_functions.pop()
+        if open_functions:
+            call_name = get_node_text(name_node)
+            if call_name:
+                for _, calls in open_functions:
+                    calls.append(call_name)
+
+    ordered = sorted(definitions.items(), key=lambda item: (item[1][0], item[0][0]))
+    return [(func_node, get_node_text(name_node), calls_by_key[key])
+            for key, (_, func_node, name_node) in ordered]
 
 def get_node_text(node):
     try:
@@ -106,121 +262,376 @@ def get_function_name(func_node, name_field):
         pass
     return None
 
-def get_calls_in_function(func_node, call_node_type, call_function_field):
-    calls = []
-    for call_node in traverse_tree(func_node, call_node_type):
-        try:
-            func_name_node = call_node.child_by_field_name(call_function_field)
-            if func_name_node:
-                if func_name_node.type == 'identifier':
-                    call_name = get_node_text(func_name_node)
-                    if call_name:
-                        calls.append(call_name)
-            else:
-                for child in call_node.children:
-                    if child.type == 'identifier':
-                        call_name = get_node_text(child)
-                        if call_name:
-                            calls.append(call_name)
-                            break
-        except:
-            pass
-    return calls
+def get_call_name(call_node, call_function_field):
+    try:
+        func_name_node = call_node.child_by_field_name(call_function_field)
+        if func_name_node:
+            if func_name_node.type == 'identifier':
+                return get_node_text(func_name_node)
+        else:
+            for child in call_node.children:
+                if child.type == 'identifier':
+                    return get_node_text(child)
+    except:
+        pass
+    return None
+
+# Files at least this big are mmapped for parsing instead of read into memory
+SKELETON_MMAP_MIN_BYTES = int(os.getenv('SKELETON_MMAP_MIN_BYTES', str(1024 * 1024)))
+
+class Snippet:
+    """A function's source as a (start_byte, end_byte) range of its file.
+
+    The graph (and the results pool workers send back) only holds the offsets; the text
+    is read and decoded when it is actually needed, i.e. for the LLM prompt, the snippet
+    hash and the JSON store (see snippet_text). The file must still exist by then, which
+    it does for the duration of analyze_repo.
+    """
+    __slots__ = ('file_path', 'start_byte', 'end_byte')
+
+    def __init__(self, file_path, start_byte, end_byte):
+        self.file_path = file_path
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+
+    def text(self):
+        st = os.stat(self.file_path)
+        source = _source_bytes(self.file_path, st.st_mtime_ns, st.st_size)
+        text = str(memoryview(source)[self.start_byte:self.end_byte], 'utf-8', 'replace')
+        if '\r' in text:
+            # Same newlines the file used to be read with (text mode)
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+
+@functools.lru_cache(maxsize=16)
+def _source_bytes(file_path, mtime_ns, size):
+    # Keyed on mtime/size so a reused checkout path never serves stale bytes.
+    # Snippets are materialized file by file, so a few entries give nearly every hit.
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+def snippet_text(code_snippet):
+    """Text of a graph "code_snippet": a Snippet for freshly parsed functions, a str
+    for functions carried over from a stored graph."""
+    return code_snippet.text() if isinstance(code_snippet, Snippet) else code_snippet
 
 def parse_file(file_path, parser, language_object, config):
-    functions = {}
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code = f.read()
-        code_bytes = bytes(code, "utf8")
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size >= SKELETON_MMAP_MIN_BYTES:
+                source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                source = f.read()
     except Exception as e:
         print(f" Skipping (could not read): {e}")
         return {}
 
     try:
-        tree = parser.parse(code_bytes)
+        return extract_functions(file_path, source, parser, config)
+    finally:
+        if isinstance(source, mmap.mmap):
+            source.close()
+
+def extract_functions(file_path, source, parser, config):
+    """Parse raw `source` bytes (bytes or mmap) and return {name: {code_snippet, calls}}."""
+    functions = {}
+    try:
+        tree = parser.parse(source)
         root = tree.root_node
     except Exception as e:
         print(f" Skipping (parsing error): {e}")
         return {}
 
     try:
-        func_node_types = config.get('function_node_types', [config.get('function_node_type')])
-        if isinstance(func_node_types, str):
-            func_node_types = [func_node_types]
-        
-        for func_type in func_node_types:
-            if not func_type:
-                continue
-                
-            for func_node in traverse_tree(root, func_type):
-                func_name = get_function_name(func_node, config.get('function_name_field', 'name'))
-                
-                if not func_name:
-                    continue
-                
-                code_snippet = get_node_text(func_node)
-                
-                calls = get_calls_in_function(
-                    func_node, 
+        query = config.get('query')
+        if query is not None:
+            extracted = collect_functions_query(root, query)
+        else:
+            func_node_types = config.get('function_node_types', [config.get('function_node_type')])
+            if isinstance(func_node_types, str):
+                func_node_types = [func_node_types]
+
+            func_node_types = [t for t in func_node_types if t]
+            name_field = config.get('function_name_field', 'name')
+            extracted = [
+                (func_node, get_function_name(func_node, name_field), calls)
+                for func_node, calls in collect_functions(
+                    root,
+                    func_node_types,
                     config.get('call_node_type', 'call'),
                     config.get('call_function_field', 'function')
                 )
-                
-                functions[func_name] = {
-                    "code_snippet": code_snippet,
-                    "calls": list(set(calls))
-                }
+            ]
+
+        for func_node, func_name, calls in extracted:
+            if not func_name:
+                continue
+
+            functions[func_name] = {
+                "code_snippet": Snippet(file_path, func_node.start_byte, func_node.end_byte),
+                # First-seen order, so the graph is the same on every run
+                "calls": list(dict.fromkeys(calls))
+            }
     except Exception as e:
         print(f"Could not parse functions: {e}")
     
     return functions
 
-def build_skeleton_graph(repo_url, clone_dir):
-    parser_manager = MultiLanguageParser(LANGUAGE_CONFIG)
-    parser_manager.load_languages()
+# Parsing is CPU-bound, so big repos are sharded across a process pool. Small ones
+# stay in-process, where pool startup would cost more than it saves.
+SKELETON_WORKERS = int(os.getenv('SKELETON_WORKERS', str(os.cpu_count() or 1)))
+SKELETON_PARALLEL_MIN_FILES = int(os.getenv('SKELETON_PARALLEL_MIN_FILES', '64'))
+
+_worker_parser_manager = None
+
+def _exit_with_parent():
+    # The pool outlives single analyses, so don't outlive a parent that was killed hard
+    multiprocessing.parent_process().join()
+    os._exit(0)
+
+def _init_skeleton_worker():
+    # Runs once per worker process; each grammar is loaded on first use, once
+    global _worker_parser_manager
+    warnings.simplefilter("ignore")
+    threading.Thread(target=_exit_with_parent, daemon=True).start()
+    _worker_parser_manager = MultiLanguageParser(LANGUAGE_CONFIG, quiet=True)
+
+def _parse_in_worker(file_path):
+    parser_tuple = _worker_parser_manager.get_parser(os.path.splitext(file_path)[1])
+    if not parser_tuple:
+        return {}
+    parser, lang_obj, config = parser_tuple
+    return parse_file(file_path, parser, lang_obj, config)
+
+_skeleton_pools = {}  # worker count -> ProcessPoolExecutor, kept for the life of the process
+_skeleton_pools_lock = threading.Lock()
+
+def get_skeleton_pool(workers):
+    """Process-wide parse pool. Spawned workers re-import the main module (for the service,
+    main.py and its whole LLM stack), so they are started once and reused by every
+    analysis; the entrypoint must keep `app.run` behind `if __name__ == '__main__'`."""
+    with _skeleton_pools_lock:
+        pool = _skeleton_pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_skeleton_worker)
+            _skeleton_pools[workers] = pool
+        return pool
+
+def _discard_skeleton_pool(workers, pool):
+    with _skeleton_pools_lock:
+        if _skeleton_pools.get(workers) is pool:
+            del _skeleton_pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def parse_files(file_paths, parser_manager, workers=None):
+    """Parse `file_paths`, returning their function maps in the same order.
+
+    Uses a process pool when there are enough files; the pool is spawned rather than
+    forked because the ingest service calls this from worker threads.
+    """
+    workers = SKELETON_WORKERS if workers is None else workers
+    if workers <= 1 or len(file_paths) < SKELETON_PARALLEL_MIN_FILES:
+        results = []
+        for file_path in file_paths:
+            parser, lang_obj, config = parser_manager.get_parser(os.path.splitext(file_path)[1])
+            results.append(parse_file(file_path, parser, lang_obj, config))
+        return results
+
+    chunksize = max(1, len(file_paths) // (workers * 4))
+    start = time.time()
+    for attempt in range(2):
+        pool = get_skeleton_pool(workers)
+        try:
+            results = list(pool.map(_parse_in_worker, file_paths, chunksize=chunksize))
+            break
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge file): replace the pool and try once more
+            _discard_skeleton_pool(workers, pool)
+            if attempt:
+                raise
+    print(f"Parsed {len(file_paths)} files on {workers} processes in {time.time() - start:.1f}s")
+    return results
+
+def build_skeleton_graph(repo_url, clone_dir, file_blobs=None, previous_graph=None):
+    """Parse every supported source file into the function graph.
+
+    When `file_blobs` (path -> git blob SHA) and a `previous_graph` are given, files
+    whose blob SHA matches the previous run are not re-parsed: their functions,
+    summaries included, are carried over from the previous graph.
+
+    Files are collected in walk order, the changed ones parsed (in parallel for big
+    repos, see parse_files), and the results merged back in walk order, so function
+    keys and their `::name_N` suffixes do not depend on how parsing was scheduled.
+    """
+    parser_manager = get_parser_registry()
+
+    file_blobs = file_blobs or {}
+    previous_blobs = (previous_graph or {}).get("file_blobs", {})
+    previous_functions = {}
+    for function_key, function_info in (previous_graph or {}).get("functions", {}).items():
+        previous_functions.setdefault(function_info["file_path"], []).append((function_key, function_info))
+    reused_files = 0
 
     graph = {
         "repository_url": repo_url,
+        "extraction": extraction_digest(),
         "file_system_map": {},
+        "file_blobs": {},
         "functions": {}
     }
 
+    # (relative_path, file_path or None if reused), in walk order
+    ordered_files = []
+    for root, dirs, files in os.walk(clone_dir, topdown=True):
+        dirs[:] = [d for d in dirs if d not in ['.git', 'node_modules', '__pycache__']]
+        relative_root = os.path.relpath(root, clone_dir)
+        if relative_root == '.':
+            relative_root = '/'
+        else:
+            relative_root = f"/{relative_root.replace(os.sep, '/')}"
+        if files:
+            graph["file_system_map"][relative_root] = files
+        for file in files:
+            file_path = os.path.join(root, file)
+            _, file_ext = os.path.splitext(file)
+            if parser_manager.get_parser(file_ext):
+                relative_path = os.path.relpath(file_path, clone_dir).replace('\\', '/')
+                blob_sha = file_blobs.get(relative_path)
+                if blob_sha:
+                    graph["file_blobs"][relative_path] = blob_sha
+                if blob_sha and previous_blobs.get(relative_path) == blob_sha:
+                    # Unchanged since the last run: keep its functions and summaries
+                    ordered_files.append((relative_path, None))
+                    reused_files += 1
+                else:
+                    ordered_files.append((relative_path, file_path))
+
+    to_parse = [file_path for _, file_path in ordered_files if file_path]
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
-        for root, dirs, files in os.walk(clone_dir, topdown=True):
-            dirs[:] = [d for d in dirs if d not in ['.git', 'node_modules', '__pycache__']]
-            relative_root = os.path.relpath(root, clone_dir)
-            if relative_root == '.':
-                relative_root = '/'
-            else:
-                relative_root = f"/{relative_root.replace(os.sep, '/')}"
-            if files:
-                graph["file_system_map"][relative_root] = files
-            for file in files:
-                file_path = os.path.join(root, file)
-                _, file_ext = os.path.splitext(file)
-                parser_tuple = parser_manager.get_parser(file_ext)
-                if parser_tuple:
-                    relative_path = os.path.relpath(file_path, clone_dir).replace('\\', '/')
-                    parser, lang_obj, config = parser_tuple
-                    file_functions = parse_file(file_path, parser, lang_obj, config)
-                    for func_name, func_data in file_functions.items():
-                        function_key = f"{relative_path}::{func_name}"
-                        if function_key in graph["functions"]:
-                            i = 2
-                            while f"{function_key}_{i}" in graph["functions"]:
-                                i += 1
-                            function_key = f"{function_key}_{i}"
-                        graph["functions"][function_key] = {
-                            "file_path": relative_path,
-                            "function_name": func_name,
-                            "code_snippet": func_data["code_snippet"],
-                            "calls": func_data["calls"],
-                            "summary": None
-                        }
+        parsed = iter(parse_files(to_parse, parser_manager))
+
+    for relative_path, file_path in ordered_files:
+        if file_path is None:
+            for function_key, function_info in previous_functions.get(relative_path, []):
+                graph["functions"][function_key] = function_info
+            continue
+        for func_name, func_data in next(parsed).items():
+            function_key = f"{relative_path}::{func_name}"
+            if function_key in graph["functions"]:
+                i = 2
+                while f"{function_key}_{i}" in graph["functions"]:
+                    i += 1
+                function_key = f"{function_key}_{i}"
+            graph["functions"][function_key] = {
+                "file_path": relative_path,
+                "function_name": func_name,
+                "code_snippet": func_data["code_snippet"],
+                "calls": func_data["calls"],
+                "summary": None
+            }
+    if previous_graph:
+        print(f"Reused {reused_files} unchanged files from the previous analysis, "
+              f"parsed {len(graph['file_blobs']) - reused_files} changed or new files")
+    return graph
+
+# --- Incremental analysis store ---
+
+GRAPH_STORE_DIR = os.getenv('GRAPH_STORE_DIR', 'cache/graphs')
+GRAPH_STORE_MAX_MB = int(os.getenv('GRAPH_STORE_MAX_MB', '1024'))
+# Bump when the extracted function data changes shape or meaning
+GRAPH_FORMAT_VERSION = 1
+
+@functools.lru_cache(maxsize=None)
+def extraction_digest():
+    """Digest of everything that decides which functions get extracted from a file.
+
+    Stored graphs carry it; one built with other queries or language config is not reused.
+    """
+    digest = hashlib.sha256(f"v{GRAPH_FORMAT_VERSION}".encode('utf-8'))
+    digest.update(json.dumps(LANGUAGE_CONFIG, sort_keys=True).encode('utf-8'))
+    for name in sorted(os.listdir(QUERY_DIR)) if os.path.isdir(QUERY_DIR) else []:
+        if name.endswith('.scm'):
+            digest.update(name.encode('utf-8'))
+            with open(os.path.join(QUERY_DIR, name), 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def get_file_blobs(clone_dir):
+    """Map each tracked file's repo-relative path to its git blob SHA."""
+    blobs = {}
+    # -z: NUL-separated "<mode> <sha> <stage>\t<path>" records, paths unquoted
+    for entry in git.Repo(clone_dir).git.ls_files('-s', '-z').split('\0'):
+        if not entry:
+            continue
+        meta, path = entry.split('\t', 1)
+        blobs[path] = meta.split()[1]
+    return blobs
+
+def graph_store_path(repo_url):
+    key = hashlib.sha256(repo_url.rstrip('/').removesuffix('.git').lower().encode('utf-8')).hexdigest()[:24]
+    return os.path.join(GRAPH_STORE_DIR, f"{key}.json")
+
+def load_stored_graph(repo_url):
+    path = graph_store_path(repo_url)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            graph = json.load(f)
+    except Exception as e:
+        print(f"Could not load stored graph {path}: {e}")
+        return None
+    if graph.get("extraction") != extraction_digest():
+        print(f"Stored graph {path} was built with other queries or language config, ignoring it")
+        return None
+    os.utime(path)  # eviction is least recently used first
     return graph
 
+def _json_default(value):
+    if isinstance(value, Snippet):
+        return value.text()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def save_stored_graph(repo_url, graph):
+    path = graph_store_path(repo_url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        # Snippets are materialized here, one at a time
+        json.dump(graph, f, default=_json_default)
+    os.replace(tmp_path, path)
+    try:
+        evict_stored_graphs(keep=path)
+    except Exception as e:
+        print(f"Graph store eviction failed: {e}")
+
+def evict_stored_graphs(keep=None, max_bytes=None):
+    """Delete least recently used graphs until the store fits in GRAPH_STORE_MAX_MB."""
+    max_bytes = GRAPH_STORE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    graphs = []
+    for name in os.listdir(GRAPH_STORE_DIR):
+        path = os.path.join(GRAPH_STORE_DIR, name)
+        if name.endswith('.json'):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            graphs.append((st.st_mtime, path, st.st_size))
+    total = sum(size for _, _, size in graphs)
+    for _, path, size in sorted(graphs):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        print(f"Evicted stored graph {path} ({size // 1024} KB)")
+
 # --- Logic from 2_enrich_graph.py ---
 
 SYSTEM_PROMPT = """
@@ -234,38 +645,124 @@ The JSON object must have these exact keys:
 - "dependencies": An array of strings, listing any key libraries or modules used within this function.
 """
 
-def enrich_graph(graph_data, llm):
+# Enrichment engine limits: requests in flight per job, seconds per call, retries after the
+# first attempt. Every call also holds one of the process-wide LLM_CONCURRENCY slots
+# (llm_limits), so all jobs together stay within that budget.
+ENRICH_CONCURRENCY = int(os.getenv('ENRICH_CONCURRENCY', str(LLM_CONCURRENCY)))
+ENRICH_TIMEOUT = float(os.getenv('ENRICH_TIMEOUT', '120'))
+ENRICH_MAX_RETRIES = int(os.getenv('ENRICH_MAX_RETRIES', '2'))
+ENRICH_BACKOFF = float(os.getenv('ENRICH_BACKOFF', '2'))
+
+def truncate_snippet(code_snippet):
+    # Truncate very long snippets
+    if len(code_snippet) > 3000:
+        return code_snippet[:3000] + "\n... (truncated for token limit)"
+    return code_snippet
+
+async def _enrich_function(function_key, code_snippet, llm, prompt, limiter, timeout, max_retries, backoff):
+    for attempt in range(max_retries + 1):
+        try:
+            async with limiter:
+                # Read and decoded only while in flight, not for every queued function at once
+                snippet = truncate_snippet(snippet_text(code_snippet))
+                async with llm_slot():
+                    return await asyncio.wait_for(
+                        cached_ainvoke(llm, FunctionSummary, prompt, {'code_snippet': snippet}),
+                        timeout
+                    )
+        except Exception as e:
+            reason = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)[:100]
+            if attempt == max_retries:
+                raise RuntimeError(f"{reason} (after {attempt + 1} attempts)") from e
+            delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            print(f"  ! {function_key}: {reason}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+async def _enrich_all(graph_data, snippet_groups, llm, prompt, max_in_flight, timeout, max_retries, backoff):
+    limiter = asyncio.Semaphore(max_in_flight)
+    total_count = len(snippet_groups)
+
+    async def run(function_keys):
+        code_snippet = graph_data["functions"][function_keys[0]]["code_snippet"]
+        try:
+            summary = await _enrich_function(
+                function_keys[0], code_snippet,
+                llm, prompt, limiter, timeout, max_retries, backoff
+            )
+            return function_keys, summary, None
+        except Exception as e:
+            return function_keys, None, e
+
+    succeeded = 0
+    failed = []
+    pending = [run(function_keys) for function_keys in snippet_groups]
+    for done, next_result in enumerate(asyncio.as_completed(pending), 1):
+        function_keys, summary_object, error = await next_result
+        shared = f" (+{len(function_keys) - 1} identical)" if len(function_keys) > 1 else ""
+        if error is None:
+            # Fan the one summary out to every function with the same snippet
+            for function_key in function_keys:
+                graph_data["functions"][function_key]["summary"] = summary_object.dict()
+            succeeded += len(function_keys)
+            print(f"[{done}/{total_count}] ✓ {function_keys[0]}{shared}")
+        else:
+            failed.extend(function_keys)
+            print(f"[{done}/{total_count}] ✗ FAILED to enrich {function_keys[0]}{shared}: {str(error)[:100]}")
+    return succeeded, failed
+
+def snippet_hash(code_snippet):
+    """Hash of a snippet with line endings and trailing whitespace normalized."""
+    lines = code_snippet.replace('\r\n', '\n').replace('\r', '\n').strip().split('\n')
+    normalized = '\n'.join(line.rstrip() for line in lines)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def group_by_snippet(function_keys, functions):
+    """Group function keys whose code snippets are identical after normalization."""
+    groups = {}
+    for function_key in function_keys:
+        groups.setdefault(snippet_hash(snippet_text(functions[function_key]["code_snippet"])), []).append(function_key)
+    return list(groups.values())
+
+def enrich_graph(graph_data, llm, max_in_flight=None, timeout=None, max_retries=None, backoff=None):
+    """Fill in the summary of every function that doesn't have one yet.
+
+    Functions with identical (normalized) snippets are summarized once and share the
+    result. Up to `max_in_flight` model calls run concurrently; each is bounded by
+    `timeout` seconds and retried with exponential backoff. Summaries are written into
+    graph_data["functions"] as soon as each call completes.
+    """
     # It's better to pass the LLM from main.py so we can configure it there
-    structured_llm = llm.with_structured_output(FunctionSummary)
     prompt = ChatPromptTemplate.from_messages([
         ('system', SYSTEM_PROMPT),
         ('human', "Code Snippet:\n```\n{code_snippet}\n```")
     ])
-    chain = prompt | structured_llm
 
     functions_to_process = [
-        (key, info) for key, info in graph_data["functions"].items()
+        key for key, info in graph_data["functions"].items()
         if info.get("summary") is None
     ]
+    snippet_groups = group_by_snippet(functions_to_process, graph_data["functions"])
     
     total_count = len(functions_to_process)
-    print(f"\nFound {total_count} functions to process")
-    
-    for i, (function_key, function_info) in enumerate(functions_to_process):
-        print(f"[{i+1}/{total_count}] {function_key}")
-        code_snippet = function_info["code_snippet"]
-        
-        try:
-            # Truncate very long snippets
-            if len(code_snippet) > 3000:
-                code_snippet = code_snippet[:3000] + "\n... (truncated for token limit)"
-            
-            summary_object = chain.invoke({'code_snippet': code_snippet})
-            graph_data["functions"][function_key]["summary"] = summary_object.dict()
-            print(f"  ✓ Success")
-            
-        except Exception as e:
-            print(f"  ✗ FAILED to enrich {function_key}: {str(e)[:100]}")
+    saved_calls = total_count - len(snippet_groups)
+    max_in_flight = max_in_flight or ENRICH_CONCURRENCY
+    print(f"\nFound {total_count} functions to process, {len(snippet_groups)} unique snippets "
+          f"({saved_calls} calls saved by deduplication, {max_in_flight} in flight)")
+    if not functions_to_process:
+        return graph_data
+
+    start = time.time()
+    succeeded, failed = asyncio.run(_enrich_all(
+        graph_data, snippet_groups, llm, prompt,
+        max_in_flight,
+        timeout or ENRICH_TIMEOUT,
+        ENRICH_MAX_RETRIES if max_retries is None else max_retries,
+        ENRICH_BACKOFF if backoff is None else backoff
+    ))
+    print(f"Enriched {succeeded}/{total_count} functions with {len(snippet_groups)} model calls "
+          f"in {time.time() - start:.1f}s ({saved_calls} calls saved)")
+    if failed:
+        print(f"  ✗ {len(failed)} failed: {', '.join(failed[:10])}")
             
     return graph_data
 
@@ -338,23 +835,39 @@ def generate_pages_from_graph(enriched_graph):
 
 # --- Orchestrator Function ---
 
-def analyze_repo(repo_url, llm):
+def analyze_repo(repo_url, llm, clone_dir=None):
     """
     Analyzes a repository and returns a dictionary with enriched graph and generated pages.
     Returns a dict with keys: 'graph' (the enriched graph) and 'pages' (the generated pages dict)
+
+    Pass `clone_dir` to analyze an existing checkout (e.g. the one ingest already made);
+    otherwise a worktree is checked out from the shared mirror cache and released afterwards.
+    Newly parsed functions in the returned graph hold their code as Snippets, which read
+    from the checkout; use snippet_text() on them only while it still exists.
     """
-    folder_name = uuid.uuid4()
-    clone_dir = f'tmp/{folder_name}'
+    checkout = None
     
     try:
-        print(f"Cloning {repo_url} into {clone_dir}...")
-        git.Repo.clone_from(repo_url, clone_dir, depth=1)
-        
+        if clone_dir is None:
+            print(f"Checking out {repo_url} from the mirror cache...")
+            checkout = get_repo_cache().acquire(repo_url)
+            clone_dir = checkout.path
+
+        file_blobs = get_file_blobs(clone_dir)
+        previous_graph = load_stored_graph(repo_url)
+        if previous_graph:
+            print(f"Found stored graph with {len(previous_graph.get('functions', {}))} functions")
+
         print("\nBuilding skeleton graph...")
-        skeleton_graph = build_skeleton_graph(repo_url, clone_dir)
+        skeleton_graph = build_skeleton_graph(repo_url, clone_dir, file_blobs, previous_graph)
         
         print("\nEnriching graph with LLM summaries...")
         enriched_graph = enrich_graph(skeleton_graph, llm)
+
+        try:
+            save_stored_graph(repo_url, enriched_graph)
+        except Exception as e:
+            print(f"Could not store enriched graph: {e}")
         
         print("\nGenerating pages from enriched graph...")
         pages = generate_pages_from_graph(enriched_graph)
@@ -370,7 +883,7 @@ def analyze_repo(repo_url, llm):
         # Re-raise the exception to be handled by the caller
         raise
     finally:
-        # Clean up the cloned repo
-        if os.path.isdir(clone_dir):
-            print(f"Cleaning up {clone_dir}...")
-            shutil.rmtree(clone_dir)
\ No newline at end of file
+        # Release the checkout if we made it
+        if checkout is not None:
+            print(f"Releasing checkout {clone_dir}...")
+            checkout.release()
\ No newline at end of file
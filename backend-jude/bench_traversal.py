@@ -0,0 +1,138 @@
+"""
+Benchmark: query-driven extraction (analysis.parse_file with queries/*.scm) and the
+single-pass TreeCursor fallback against the old recursive traverse_tree implementation,
+on large generated Python and JavaScript files.
+
+    python bench_traversal.py [functions_per_file]
+
+Needs tree-sitter and the tree-sitter-python / tree-sitter-javascript grammars.
+"""
+import os
+import sys
+import time
+import tempfile
+
+import analysis
+
+
+# --- The previous implementation, kept here only for comparison ---
+
+def legacy_traverse_tree(node, node_type):
+    if node.type == node_type:
+        yield node
+    for child in node.children:
+        yield from legacy_traverse_tree(child, node_type)
+
+def legacy_extract(root, config):
+    functions = {}
+    func_node_types = config.get('function_node_types', [config.get('function_node_type')])
+    for func_type in func_node_types:
+        for func_node in legacy_traverse_tree(root, func_type):
+            func_name = analysis.get_function_name(func_node, config.get('function_name_field', 'name'))
+            if not func_name:
+                continue
+            calls = []
+            for call_node in legacy_traverse_tree(func_node, config['call_node_type']):
+                call_name = analysis.get_call_name(call_node, config['call_function_field'])
+                if call_name:
+                    calls.append(call_name)
+            functions[func_name] = {
+                "code_snippet": analysis.get_node_text(func_node),
+                "calls": list(set(calls))
+            }
+    return functions
+
+
+# --- Generated inputs ---
+
+def python_source(n):
+    chunks = []
+    for i in range(n):
+        chunks.append(f"""
+class Service{i}:
+    def handle_{i}(self, request):
+        data = parse_{i}(request)
+        if validate(data):
+            for item in data:
+                process(item, helper_{i}(item))
+        def inner_{i}(x):
+            return transform(x) + lookup(x)
+        return inner_{i}(data)
+
+def helper_{i}(value):
+    return compute(value, config_{i}()) if value else default()
+""")
+    return "".join(chunks)
+
+def javascript_source(n):
+    chunks = []
+    for i in range(n):
+        chunks.append(f"""
+function load{i}(id) {{
+  const data = fetchData(id);
+  return data.map((x) => normalize(x)).filter((x) => keep{i}(x));
+}}
+
+class Widget{i} {{
+  render(props) {{
+    const items = buildItems(props);
+    return items.forEach((it) => {{ draw(it); log(it); }});
+  }}
+}}
+
+const handler{i} = (event) => dispatch(event, load{i}(event.id));
+""")
+    return "".join(chunks)
+
+
+def bench(label, source, suffix, parser_tuple, rounds=3):
+    parser, lang_obj, config = parser_tuple
+    with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as f:
+        f.write(source)
+        path = f.name
+    try:
+        cursor_config = {k: v for k, v in config.items() if k != 'query'}
+
+        def query():
+            return analysis.parse_file(path, parser, lang_obj, config)
+
+        def cursor():
+            return analysis.parse_file(path, parser, lang_obj, cursor_config)
+
+        def old():
+            # Same read + parse as parse_file, then the old extraction
+            with open(path, 'r', encoding='utf-8') as fh:
+                tree = parser.parse(bytes(fh.read(), "utf8"))
+            return legacy_extract(tree.root_node, config)
+
+        def texts(functions):
+            return [(k, analysis.snippet_text(v["code_snippet"]), v["calls"]) for k, v in functions.items()]
+
+        a, b, c = query(), old(), cursor()
+        same = list(a) == list(b) and all(
+            analysis.snippet_text(a[k]["code_snippet"]) == b[k]["code_snippet"]
+            and sorted(a[k]["calls"]) == sorted(b[k]["calls"])
+            for k in a
+        ) and texts(a) == texts(c)
+        timings = {}
+        for name, fn in (("recursive", old), ("cursor", cursor), ("query", query)):
+            best = float('inf')
+            for _ in range(rounds):
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+        print(f"{label:<11} {len(source) / 1024:8.0f} KB {len(a):6d} functions  "
+              f"recursive {timings['recursive'] * 1000:8.1f} ms  cursor {timings['cursor'] * 1000:8.1f} ms  "
+              f"query {timings['query'] * 1000:8.1f} ms  x{timings['recursive'] / timings['query']:.1f}  "
+              f"same output: {same}")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    manager = analysis.MultiLanguageParser(analysis.LANGUAGE_CONFIG)
+    manager.load_languages(quiet=True)
+    bench("python", python_source(n), ".py", manager.get_parser(".py"))
+    bench("javascript", javascript_source(n), ".js", manager.get_parser(".js"))
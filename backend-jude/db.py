@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+REPO_STORE = os.getenv('REPO_STORE', 'sqlite')
+REPO_STORE_PATH = os.getenv('REPO_STORE_PATH', 'cache/repos.sqlite3')
+
+FINISHED_JOB_STATUSES = ('succeeded', 'failed')
+
+
+class RepoStore(ABC):
+    """Storage for ingest results, keyed by repo name, plus the ingest job records.
+
+    list_names() returns the most recently updated repos first. Jobs are kept here rather
+    than in the process so every worker can answer /jobs/<id> and they survive a restart.
+    """
+
+    @abstractmethod
+    def put(self, name: str, doc: dict):
+        ...
+
+    @abstractmethod
+    def get(self, name: str):
+        ...
+
+    @abstractmethod
+    def list_names(self, offset: int = 0, limit: int = None) -> list:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def put_job(self, job_id: str, data: dict):
+        ...
+
+    @abstractmethod
+    def get_job(self, job_id: str):
+        ...
+
+    @abstractmethod
+    def prune_jobs(self, keep: int):
+        """Delete all but the `keep` most recent finished jobs; unfinished ones are never deleted."""
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+
+class MemoryRepoStore(RepoStore):
+    """Process-local store; what `db = {}` used to be. Lost on restart."""
+
+    def __init__(self):
+        self._docs = {}
+        self._updated = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def put(self, name: str, doc: dict):
+        with self._lock:
+            self._docs[name] = doc
+            self._updated[name] = time.time()
+
+    def get(self, name: str):
+        with self._lock:
+            return self._docs.get(name)
+
+    def list_names(self, offset: int = 0, limit: int = None) -> list:
+        with self._lock:
+            names = sorted(self._docs, key=lambda n: self._updated[n], reverse=True)
+        return names[offset:None if limit is None else offset + limit]
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._docs)
+
+    def put_job(self, job_id: str, data: dict):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._jobs[job_id] = data
+
+    def get_job(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def prune_jobs(self, keep: int):
+        with self._lock:
+            finished = [job_id for job_id, data in self._jobs.items() if data['status'] in FINISHED_JOB_STATUSES]
+            for job_id in finished[:max(len(finished) - keep, 0)]:
+                del self._jobs[job_id]
+
+
+class SQLiteRepoStore(RepoStore):
+    """SQLite-backed store that several worker processes can share.
+
+    Documents are stored as zlib-compressed JSON, indexed by repo name (primary key)
+    and by update time for listing.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''CREATE TABLE IF NOT EXISTS repos (
+                name TEXT PRIMARY KEY,
+                doc BLOB NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS repos_updated_at ON repos (updated_at)')
+            conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                finished INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_finished_updated_at ON jobs (finished, updated_at)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def put(self, name: str, doc: dict):
+        blob = zlib.compress(json.dumps(doc).encode('utf-8'))
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO repos (name, doc, updated_at) VALUES (?, ?, ?)',
+                (name, blob, time.time())
+            )
+
+    def get(self, name: str):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT doc FROM repos WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def list_names(self, offset: int = 0, limit: int = None) -> list:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                'SELECT name FROM repos ORDER BY updated_at DESC LIMIT ? OFFSET ?',
+                (-1 if limit is None else limit, offset)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM repos').fetchone()[0]
+
+    def put_job(self, job_id: str, data: dict):
+        blob = zlib.compress(json.dumps(data).encode('utf-8'))
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO jobs (job_id, data, finished, updated_at) VALUES (?, ?, ?, ?)',
+                (job_id, blob, int(data['status'] in FINISHED_JOB_STATUSES), time.time())
+            )
+
+    def get_job(self, job_id: str):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def prune_jobs(self, keep: int):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                '''DELETE FROM jobs WHERE job_id IN (
+                    SELECT job_id FROM jobs WHERE finished = 1 ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+                )''',
+                (max(keep, 0),)
+            )
+
+
+def make_store(kind: str = None, path: str = None) -> RepoStore:
+    """Build the configured store: REPO_STORE=sqlite (default) or memory."""
+    kind = (kind or REPO_STORE).lower()
+    if kind == 'memory':
+        return MemoryRepoStore()
+    if kind == 'sqlite':
+        store = SQLiteRepoStore(path or REPO_STORE_PATH)
+        logger.info(f"Repo store: SQLite at {store.path}")
+        return store
+    raise ValueError(f"Unknown REPO_STORE '{kind}' (expected 'sqlite' or 'memory')")
@@ -0,0 +1,186 @@
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised when the job queue already holds as many jobs as it allows."""
+
+
+class Job:
+    """A single unit of background work plus the progress reported while it runs.
+
+    Every change is written through to `store` (see db.RepoStore.put_job) so any worker
+    process can report on the job, not just the one running it.
+    """
+
+    def __init__(self, kind: str, params: dict, store=None):
+        self.id = str(uuid.uuid4())[:8]
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.step = None
+        self.steps = []
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self._store = store
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+
+    def set_step(self, message: str):
+        """Record a progress stage (e.g. "Step 1/7: Detecting dependencies...")."""
+        logger.info(f"[{self.id}] {message}")
+        with self._lock:
+            self.step = message
+            self.steps.append({ 'message': message, 'at': datetime.utcnow().isoformat() })
+        self.save()
+
+    def save(self):
+        """Write the current state to the store; also serves as the job's heartbeat."""
+        if self._store is None:
+            return
+        # Snapshot and write under one lock so a slower writer never overwrites newer state
+        with self._save_lock:
+            data = self.to_dict()
+            data['heartbeat_at'] = time.time()
+            try:
+                self._store.put_job(self.id, data)
+            except Exception as e:
+                logger.warning(f"[{self.id}] Could not save job state: {e}")
+
+    def to_dict(self, include_result: bool = True) -> dict:
+        with self._lock:
+            data = {
+                'job_id': self.id,
+                'kind': self.kind,
+                'params': self.params,
+                'status': self.status,
+                'step': self.step,
+                'steps': list(self.steps),
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+            if include_result:
+                data['result'] = self.result
+            return data
+
+
+class JobQueue:
+    """Bounded worker pool that runs jobs in the background and records their status in a store.
+
+    At most `max_workers` jobs run at once and at most `max_pending` more may wait
+    for a worker; anything beyond that is rejected with QueueFull instead of piling up.
+    Job state lives in `store`, which keeps the `max_history` most recent finished jobs,
+    so a poll can be answered by any worker sharing that store. Jobs in flight are
+    re-saved every `heartbeat_interval` seconds; an unfinished job whose heartbeat is
+    older than `stale_after` belonged to a worker that died and is reported as failed.
+    """
+
+    def __init__(self, store, max_workers: int = 2, max_pending: int = 16, max_history: int = 500,
+                 heartbeat_interval: float = 30.0, stale_after: float = 120.0):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._active = {}    # job_id -> Job queued or running in this process
+        self._lock = threading.Lock()
+        self._heartbeat = None
+
+    def submit(self, kind: str, fn, params: dict = None) -> Job:
+        """Queue `fn(job)` for execution and return the Job handle immediately."""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f"Job queue is full ({self.max_workers} running, {self.max_pending} pending)")
+
+        job = Job(kind, params or {}, store=self.store)
+        job.save()
+        with self._lock:
+            self._active[job.id] = job
+            self._start_heartbeat()
+
+        try:
+            self._executor.submit(self._run, job, fn)
+        except Exception:
+            with self._lock:
+                self._active.pop(job.id, None)
+            self._slots.release()
+            raise
+        logger.info(f"[{job.id}] Queued {kind} job")
+        return job
+
+    def get(self, job_id: str):
+        """Status dict of a job run by any worker sharing the store, or None if unknown."""
+        with self._lock:
+            job = self._active.get(job_id)
+        if job is not None:
+            return job.to_dict()
+
+        data = self.store.get_job(job_id)
+        if data is None:
+            return None
+        heartbeat_at = data.pop('heartbeat_at', 0)
+        if data['status'] in ('queued', 'running') and time.time() - heartbeat_at > self.stale_after:
+            data['status'] = 'failed'
+            data['error'] = 'The worker running this job stopped before it finished'
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {}
+            for job in self._active.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return { 'max_workers': self.max_workers, 'max_pending': self.max_pending, 'jobs': counts }
+
+    def _run(self, job: Job, fn):
+        with job._lock:
+            job.status = 'running'
+            job.started_at = datetime.utcnow().isoformat()
+        job.save()
+        try:
+            result = fn(job)
+            with job._lock:
+                job.result = result
+                job.status = 'succeeded'
+        except Exception as e:
+            logger.error(f"[{job.id}] Job failed: {e}", exc_info=True)
+            with job._lock:
+                job.error = str(e)
+                job.status = 'failed'
+        finally:
+            with job._lock:
+                job.finished_at = datetime.utcnow().isoformat()
+            job.save()
+            with self._lock:
+                self._active.pop(job.id, None)
+            self._slots.release()
+            try:
+                self.store.prune_jobs(self.max_history)
+            except Exception as e:
+                logger.warning(f"Could not prune job history: {e}")
+
+    def _start_heartbeat(self):
+        # Started on first use so constructing a queue has no side effects
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+            self._heartbeat.start()
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            with self._lock:
+                jobs = list(self._active.values())
+            for job in jobs:
+                job.save()
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'cache/llm_cache.sqlite3')
+LLM_CACHE_MAX_MB = int(os.getenv('LLM_CACHE_MAX_MB', '512'))
+# Cache hits only update last_used in batches: this many hits, or this many seconds
+LLM_CACHE_TOUCH_BATCH = 64
+LLM_CACHE_TOUCH_INTERVAL = 30.0
+
+
+class LLMCache:
+    """Persistent, content-addressed cache of structured LLM responses.
+
+    Entries are keyed by a SHA-256 over the model name, the output schema and the fully
+    rendered prompt messages (system prompt included), so any change to any of them is a
+    miss. Values are the schema's model_dump() as JSON. When the stored payload exceeds
+    max_bytes the least recently used entries are evicted.
+
+    Reads never write: hits are remembered and their last_used written in batches (see
+    LLM_CACHE_TOUCH_*), and the payload total is kept up to date by triggers in a
+    one-row `stats` table, so neither get() nor put() scans the table.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched = {}   # key -> time of its latest hit, not written yet
+        self._touched_at = time.time()
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+            conn.execute('''CREATE TABLE IF NOT EXISTS stats (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                total_size INTEGER NOT NULL
+            )''')
+            conn.execute('INSERT OR IGNORE INTO stats (id, total_size) SELECT 0, COALESCE(SUM(size), 0) FROM entries')
+            conn.execute('''CREATE TRIGGER IF NOT EXISTS entries_size_insert AFTER INSERT ON entries
+                BEGIN UPDATE stats SET total_size = total_size + NEW.size WHERE id = 0; END''')
+            conn.execute('''CREATE TRIGGER IF NOT EXISTS entries_size_delete AFTER DELETE ON entries
+                BEGIN UPDATE stats SET total_size = total_size - OLD.size WHERE id = 0; END''')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        # So the row INSERT OR REPLACE deletes fires the delete trigger
+        conn.execute('PRAGMA recursive_triggers = ON')
+        return conn
+
+    @staticmethod
+    def make_key(model_name: str, schema, messages) -> str:
+        schema_json = json.dumps(schema.model_json_schema(), sort_keys=True)
+        rendered = [(m.type, m.content) for m in messages]
+        material = json.dumps([model_name, schema.__name__, schema_json, rendered], sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self._touch(key)
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict):
+        payload = json.dumps(value)
+        size = len(payload.encode('utf-8'))
+        with closing(self._connect()) as conn, conn:
+            self._flush_touches(conn)
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)',
+                (key, payload, size, time.time())
+            )
+            self._evict(conn)
+
+    def _touch(self, key: str):
+        now = time.time()
+        with self._lock:
+            self._touched[key] = now
+            due = len(self._touched) >= LLM_CACHE_TOUCH_BATCH or now - self._touched_at >= LLM_CACHE_TOUCH_INTERVAL
+        if due:
+            try:
+                with closing(self._connect()) as conn, conn:
+                    self._flush_touches(conn)
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache last_used update failed: {e}")
+
+    def _flush_touches(self, conn):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._touched_at = time.time()
+        if touched:
+            conn.executemany(
+                'UPDATE entries SET last_used = MAX(last_used, ?) WHERE key = ?',
+                [(used, key) for key, used in touched.items()]
+            )
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT total_size FROM stats WHERE id = 0').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        while total > self.max_bytes:
+            batch = conn.execute('SELECT key, size FROM entries ORDER BY last_used ASC LIMIT 256').fetchall()
+            if not batch:
+                break
+            for key, size in batch:
+                if total <= self.max_bytes:
+                    break
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                total -= size
+                evicted += 1
+        logger.info(f"LLM cache evicted {evicted} entries, now {total} bytes")
+
+    def _lookup(self, llm, schema, prompt, inputs: dict):
+        model_name = getattr(llm, 'model_name', None) or getattr(llm, 'model', '') or type(llm).__name__
+        key = self.make_key(model_name, schema, prompt.format_messages(**inputs))
+
+        try:
+            cached = self.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            cached = None
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is not None:
+            logger.debug(f"LLM cache hit for {schema.__name__} ({key[:12]})")
+            return key, schema.model_validate(cached)
+        return key, None
+
+    def _store(self, key: str, schema, response):
+        if isinstance(response, schema):
+            try:
+                self.put(key, response.model_dump())
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache write failed: {e}")
+
+    def invoke(self, llm, schema, prompt, inputs: dict):
+        """Equivalent to (prompt | llm.with_structured_output(schema)).invoke(inputs), cached."""
+        key, cached = self._lookup(llm, schema, prompt, inputs)
+        if cached is not None:
+            return cached
+        response = (prompt | llm.with_structured_output(schema)).invoke(inputs)
+        self._store(key, schema, response)
+        return response
+
+    async def ainvoke(self, llm, schema, prompt, inputs: dict):
+        """Async counterpart of invoke(), using the chain's ainvoke()."""
+        key, cached = self._lookup(llm, schema, prompt, inputs)
+        if cached is not None:
+            return cached
+        response = await (prompt | llm.with_structured_output(schema)).ainvoke(inputs)
+        self._store(key, schema, response)
+        return response
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache configured from LLM_CACHE_* env vars, or None when disabled."""
+    global _default_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache(LLM_CACHE_PATH, LLM_CACHE_MAX_MB * 1024 * 1024)
+            logger.info(f"LLM response cache at {LLM_CACHE_PATH} (max {LLM_CACHE_MAX_MB} MB)")
+        return _default_cache
+
+
+def cached_invoke(llm, schema, prompt, inputs: dict):
+    """Invoke a structured-output chain through the default cache (if enabled)."""
+    cache = get_cache()
+    if cache is None:
+        return (prompt | llm.with_structured_output(schema)).invoke(inputs)
+    return cache.invoke(llm, schema, prompt, inputs)
+
+
+async def cached_ainvoke(llm, schema, prompt, inputs: dict):
+    """Async counterpart of cached_invoke()."""
+    cache = get_cache()
+    if cache is None:
+        return await (prompt | llm.with_structured_output(schema)).ainvoke(inputs)
+    return await cache.ainvoke(llm, schema, prompt, inputs)
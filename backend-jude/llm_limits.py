@@ -0,0 +1,34 @@
+import os
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+# Max LLM requests in flight against the Ollama endpoint, shared by every ingest job:
+# the threaded get_* calls in main.py and the async enrichment calls in analysis.py
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', '4'))
+llm_slots = threading.BoundedSemaphore(LLM_CONCURRENCY)
+
+
+def _release_if_acquired(acquiring):
+    if not acquiring.cancelled() and acquiring.exception() is None:
+        llm_slots.release()
+
+
+@asynccontextmanager
+async def llm_slot():
+    """Async counterpart of `with llm_slots:`.
+
+    The blocking acquire runs in the default executor so the event loop keeps serving
+    other coroutines while this one waits for a permit.
+    """
+    acquiring = asyncio.get_running_loop().run_in_executor(None, llm_slots.acquire)
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # The acquire may still complete in its thread; hand that permit straight back
+        acquiring.add_done_callback(_release_if_acquired)
+        raise
+    try:
+        yield
+    finally:
+        llm_slots.release()
@@ -9,14 +9,13 @@ import chromadb
 from langchain_ollama import OllamaEmbeddings
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
-import uuid
 import os
-import shutil
-from glob import glob
-import git
+import time
 import json
 import requests
+from urllib.parse import urljoin
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from schemas.SerializedDoc import SerializedDoc
@@ -27,28 +26,64 @@ from schemas.Pages import Pages
 from schemas.ProjectName import ProjectName
 
 import analysis
-db = {}
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('backend.log'),
-        logging.StreamHandler()
-    ]
-)
+from llm_cache import cached_invoke
+from llm_limits import llm_slots
+from jobs import JobQueue, QueueFull
+from repo_cache import get_repo_cache
+from repo_scanner import scan_repo
+from db import make_store
+
 logger = logging.getLogger(__name__)
 
-# Nuke on start up
-# for file in glob("tmp/*"):
-#     if os.path.isdir(file):
-#         shutil.rmtree(file)
+app = Flask(__name__)
 
-if not os.path.isdir('tmp'):
-    os.mkdir('tmp/')
-    logger.info("Created tmp directory")
+# Ingest runs in the background; these bound how many repos are processed/queued at once.
+# Job status is kept in `db` so any worker can answer /jobs/<id>
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '2'))
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '16'))
 
-app = Flask(__name__)
+# Set up by create_app(), not at import time: skeleton parsing spawns worker processes
+# that re-import this script, and they must not open the store or the log file again
+db = None
+job_queue = None
+
+def create_app():
+    """Configure logging, the ingest result store and the job queue; returns the Flask app.
+
+    Runs once per process, from `python main.py` or a WSGI server (`main:create_app()`).
+    """
+    global db, job_queue
+    if job_queue is not None:
+        return app
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('backend.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+    # Nuke on start up
+    # for file in glob("tmp/*"):
+    #     if os.path.isdir(file):
+    #         shutil.rmtree(file)
+
+    if not os.path.isdir('tmp'):
+        os.mkdir('tmp/')
+        logger.info("Created tmp directory")
+
+    # Ingest results, shared by every worker process (REPO_STORE=memory for the old in-process dict)
+    db = make_store()
+    job_queue = JobQueue(db, max_workers=INGEST_WORKERS, max_pending=INGEST_QUEUE_SIZE)
+    logger.info("CORS enabled for: https://nvidia.weabonie.com, 100.74.32.124, 100.81.27.36")
+    return app
+
+def call_llm(fn, *args, **kwargs):
+    """Run one of the get_* LLM helpers while holding an llm_slots permit (see llm_limits)."""
+    with llm_slots:
+        return fn(*args, **kwargs)
 
 # Configure CORS to allow requests from specific origins
 CORS(app, resources={
@@ -61,10 +96,10 @@ CORS(app, resources={
             "https://100.81.27.36"
         ],
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["X-Total-Count"]
     }
 })
-logger.info("CORS enabled for: https://nvidia.weabonie.com, 100.74.32.124, 100.81.27.36")
 
 LANGUAGE_CONFIG = {
     'Python': {'extensions': ['py']},
@@ -83,19 +118,16 @@ LANGUAGE_CONFIG = {
     'C': {'extensions': ['c', 'h']},
 }
 
-def detect_dependencies(clone_dir):
+def detect_dependencies(clone_dir, repo_index=None):
     """Detect dependencies with better formatting and version info where possible."""
     logger.info(f"Starting dependency detection for: {clone_dir}")
+    repo_index = repo_index or scan_repo(clone_dir)
     detected_deps = []
     ext_to_lang = {f".{ext}": lang for lang, data in LANGUAGE_CONFIG.items() for ext in data['extensions']}
     
     detected_langs = set()
-    for root, dirs, files in os.walk(clone_dir):
-        dirs[:] = [d for d in dirs if d not in ['.git', 'node_modules', '__pycache__', 'vendor']]
-        for file in files:
-            _, ext = os.path.splitext(file)
-            if ext in ext_to_lang:
-                detected_langs.add(ext_to_lang[ext])
+    for entry in repo_index.iter_files(exclude_dirs=['__pycache__', 'vendor'], exts=ext_to_lang):
+        detected_langs.add(ext_to_lang[entry.ext])
 
     logger.info(f"Detected languages from file extensions: {detected_langs}")
 
@@ -200,7 +232,7 @@ def detect_dependencies(clone_dir):
     
     # Unreal Engine detection
     try:
-        uproject_files = [f for f in os.listdir(clone_dir) if f.endswith('.uproject') and os.path.isfile(os.path.join(clone_dir, f))]
+        uproject_files = [entry.name for entry in repo_index.iter_files(max_depth=0) if entry.name.endswith('.uproject')]
         if uproject_files:
             detected_deps.append('Unreal Engine')
             logger.info(f"Detected Unreal Engine project: {uproject_files[0]}")
@@ -251,11 +283,70 @@ def detect_dependencies(clone_dir):
     logger.info(f"Final dependencies detected: {final_deps}")
     return final_deps
 
-def build_project_context(clone_dir):
+# Consumers only ever look at the first few thousand chars of context['readme']
+DOCS_CHAR_BUDGET = int(os.getenv('DOCS_CHAR_BUDGET', '20000'))
+DOCS_MAX_FILE_BYTES = int(os.getenv('DOCS_MAX_FILE_BYTES', str(512 * 1024)))
+
+def rank_markdown_doc(entry):
+    """Sort key: root README, then docs/, then other root docs, then the rest; smaller first."""
+    name = entry.name.lower()
+    top = entry.parts[0].lower() if entry.parts else ''
+    if entry.depth == 0 and name.startswith('readme'):
+        tier = 0
+    elif name.startswith(('changelog', 'history', 'changes', 'license')):
+        tier = 4
+    elif top in ('docs', 'doc'):
+        tier = 1
+    elif entry.depth == 0:
+        tier = 2
+    else:
+        tier = 3
+    return (tier, entry.size, entry.path)
+
+def collect_markdown_docs(repo_index, char_budget=None, max_file_bytes=None):
+    """Read markdown docs in rank order until char_budget characters have been collected.
+
+    Files bigger than max_file_bytes are skipped using the size recorded at scan time,
+    without opening them; files that turn out to be binary (NUL bytes) are skipped too.
+    Returns (text, number_of_files_read).
+    """
+    char_budget = DOCS_CHAR_BUDGET if char_budget is None else char_budget
+    max_file_bytes = DOCS_MAX_FILE_BYTES if max_file_bytes is None else max_file_bytes
+    parts = []
+    used = 0
+    md_count = 0
+    for entry in sorted(repo_index.iter_files(exts={'.md'}, include_hidden=False), key=rank_markdown_doc):
+        remaining = char_budget - used
+        if remaining <= 0:
+            break
+        if entry.size == 0 or entry.size > max_file_bytes:
+            logger.debug(f"Skipping markdown file {entry.path} ({entry.size} bytes)")
+            continue
+        header = f'## {entry.path}\n'
+        if remaining <= len(header) + 2:
+            break
+        file_path = repo_index.full_path(entry)
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+                content = f.read(remaining - len(header) - 2)
+        except Exception as e:
+            logger.warning(f"Could not read {file_path}: {e}")
+            continue
+        if '\x00' in content:
+            logger.debug(f"Skipping binary file {entry.path}")
+            continue
+        section = f'{header}{content}\n\n'
+        parts.append(section)
+        used += len(section)
+        md_count += 1
+        logger.debug(f"Read markdown file: {entry.path} ({len(content)} chars)")
+    return ''.join(parts), md_count
+
+def build_project_context(clone_dir, repo_index=None):
     """Build comprehensive context about the project by reading actual files.
     
     HOW THE LLM SEES THE REPO:
-    1. Reads ALL .md files (README, docs, etc.) - this is the primary source
+    1. Reads .md files (README, docs, etc.) up to DOCS_CHAR_BUDGET - this is the primary source
     2. Scans file structure (up to 2 levels deep) to understand project layout
     3. Identifies entry points (index.html, main.py, etc.)
     4. Reads sample code from main files (first 2000 chars)
@@ -264,6 +355,7 @@ def build_project_context(clone_dir):
     All this context is then passed to the LLM in the prompts!
     """
     logger.info(f"Building comprehensive project context for: {clone_dir}")
+    repo_index = repo_index or scan_repo(clone_dir)
     context = {
         'readme': '',
         'file_structure': [],
@@ -272,46 +364,29 @@ def build_project_context(clone_dir):
         'main_files': []
     }
     
-    # 1. Read all markdown files
-    logger.info("Reading all markdown files...")
-    md_count = 0
-    for file_path in glob(f'{clone_dir}/**/*.md', recursive=True):
-        if os.path.isfile(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    relative_path = os.path.relpath(file_path, clone_dir)
-                    content = f.read()
-                    context['readme'] += f'## {relative_path}\n{content}\n\n'
-                    md_count += 1
-                    logger.debug(f"Read markdown file: {relative_path} ({len(content)} chars)")
-            except Exception as e:
-                logger.warning(f"Could not read {file_path}: {e}")
+    # 1. Read markdown files, most relevant first, up to the docs budget
+    logger.info("Reading markdown files...")
+    context['readme'], md_count = collect_markdown_docs(repo_index)
     
     logger.info(f"Read {md_count} markdown files, total {len(context['readme'])} characters")
     
     # 2. Get file structure (top level and important subdirs)
     logger.info("Scanning file structure...")
-    for root, dirs, files in os.walk(clone_dir):
-        # Skip hidden and build directories
-        dirs[:] = [d for d in dirs if d not in ['.git', 'node_modules', '__pycache__', 'vendor', 'dist', 'build', '.next']]
-        
-        depth = root[len(clone_dir):].count(os.sep)
-        if depth <= 2:  # Only go 2 levels deep
-            for file in files:
-                rel_path = os.path.relpath(os.path.join(root, file), clone_dir)
-                context['file_structure'].append(rel_path)
+    # Skip hidden and build directories, only go 2 levels deep
+    for entry in repo_index.iter_files(exclude_dirs=['__pycache__', 'vendor', 'dist', 'build', '.next'], max_depth=2):
+        context['file_structure'].append(entry.path)
     
     logger.info(f"Found {len(context['file_structure'])} files in structure")
     
     # 3. Identify main/entry files
     logger.info("Identifying main entry files...")
     entry_patterns = ['index.html', 'index.js', 'index.ts', 'main.py', 'app.py', 'server.js', 'main.go', 'index.tsx']
+    entry_files = list(repo_index.iter_files(names=set(entry_patterns), include_hidden=False))
     for pattern in entry_patterns:
-        for file_path in glob(f'{clone_dir}/**/{pattern}', recursive=True):
-            if os.path.isfile(file_path):
-                rel_path = os.path.relpath(file_path, clone_dir)
-                context['main_files'].append(rel_path)
-                logger.info(f"Found entry file: {rel_path}")
+        for entry in entry_files:
+            if entry.name == pattern:
+                context['main_files'].append(entry.path)
+                logger.info(f"Found entry file: {entry.path}")
     
     # 4. Read sample code from main files (limited)
     logger.info("Reading sample code from main files...")
@@ -331,8 +406,7 @@ def build_project_context(clone_dir):
     config_patterns = ['package.json', 'requirements.txt', 'Cargo.toml', 'go.mod', 'pom.xml', 
                       'docker-compose.yml', '.env.example', 'tsconfig.json', 'vite.config.js']
     for pattern in config_patterns:
-        file_path = os.path.join(clone_dir, pattern)
-        if os.path.exists(file_path):
+        if repo_index.has_file(pattern):
             context['config_files'].append(pattern)
             logger.info(f"Found config file: {pattern}")
     
@@ -348,9 +422,65 @@ def index():
 
 @app.route('/ingest')
 def ingest():
-    request_id = str(uuid.uuid4())[:8]
-    logger.info(f"[{request_id}] New ingest request received")
-    
+    repo_url = request.args.get('repo_url')
+    if not repo_url:
+        logger.error("No repo_url provided")
+        return jsonify({ 'error': 'repo_url parameter is required' }), 400
+
+    # Strip https:// or http:// prefix if present
+    repo_url = repo_url.replace('https://', '').replace('http://', '')
+    use_deep_analysis = request.args.get('deep_analysis', 'false').lower() == 'true'
+
+    try:
+        job = job_queue.submit(
+            'ingest',
+            lambda job: run_ingest(job, repo_url, use_deep_analysis),
+            params={ 'repo_url': repo_url, 'deep_analysis': use_deep_analysis }
+        )
+    except QueueFull as e:
+        logger.warning(f"Rejecting ingest for {repo_url}: {e}")
+        return jsonify({ 'error': 'Too many ingest jobs in progress, try again later.' }), 503
+
+    logger.info(f"[{job.id}] New ingest request received for {repo_url}")
+    return jsonify({ 'job_id': job.id, 'status': job.status, 'status_url': f'/jobs/{job.id}' }), 202
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({ 'msg': f'{job_id} not found' }), 404
+
+    return jsonify(job)
+
+# How long to keep polling a queued or running site build before reporting it as failed
+DOC_GEN_TIMEOUT = float(os.getenv('DOC_GEN_TIMEOUT', '1800'))
+DOC_GEN_POLL_INTERVAL = float(os.getenv('DOC_GEN_POLL_INTERVAL', '5'))
+
+def wait_for_doc_build(status_url: str, job) -> dict:
+    """Poll the documentation generator's /builds/<id> until the build finishes; returns its status."""
+    deadline = time.time() + DOC_GEN_TIMEOUT
+    last_status = None
+    while True:
+        resp = requests.get(status_url, timeout=30)
+        resp.raise_for_status()
+        build = resp.json()
+        if build['status'] in ('succeeded', 'failed'):
+            return build
+        if build['status'] != last_status:
+            job.set_step(f"Documentation build {build['status']}...")
+            last_status = build['status']
+        if time.time() > deadline:
+            raise requests.Timeout(f"Documentation build still {build['status']} after {DOC_GEN_TIMEOUT:.0f}s")
+        time.sleep(DOC_GEN_POLL_INTERVAL)
+
+def run_ingest(job, repo_url: str, use_deep_analysis: bool = False) -> dict:
+    """Clone, analyze and document a repository. Runs on a job queue worker.
+
+    Progress is reported through job.set_step(); the returned dict becomes job.result.
+    """
+    request_id = job.id
+    logger.info(f"[{request_id}] Processing repository: {repo_url}")
+
     llm = ChatOpenAI(
         # model='nemotron:70b',
         model='nemo',
@@ -359,34 +489,28 @@ def ingest():
         temperature=0
     )
 
-    repo_url = request.args.get('repo_url')
-    if not repo_url:
-        logger.error(f"[{request_id}] No repo_url provided")
-        return jsonify({ 'error': 'repo_url parameter is required' }), 400
-
-    # Strip https:// or http:// prefix if present
-    repo_url = repo_url.replace('https://', '').replace('http://', '')
-    logger.info(f"[{request_id}] Processing repository: {repo_url}")
-    
-    folder_name = uuid.uuid4()
-    clone_dir = f'tmp/{folder_name}'
-    
     try:
-        logger.info(f"[{request_id}] Cloning repository to {clone_dir}...")
-        git.Repo.clone_from(f'https://{repo_url}', clone_dir, depth=1)
-        logger.info(f"[{request_id}] Repository cloned successfully")
+        # Fetch into the shared mirror and check out a worktree; deep analysis reuses it
+        job.set_step("Cloning repository...")
+        checkout = get_repo_cache().acquire(f'https://{repo_url}')
+        clone_dir = checkout.path
+        logger.info(f"[{request_id}] Repository checked out to {clone_dir}")
     except Exception as e:
         logger.error(f"[{request_id}] Failed to clone repo: {e}")
-        return jsonify({ 'error': 'Failed to clone repository.' }), 500
+        raise RuntimeError('Failed to clone repository.') from e
 
     try:
         # 1. Detect dependencies
-        logger.info(f"[{request_id}] Step 1/7: Detecting dependencies...")
-        dependencies = detect_dependencies(clone_dir)
+        # Walk the checkout once; every step below queries this index
+        repo_index = scan_repo(clone_dir)
+        logger.info(f"[{request_id}] Indexed {len(repo_index.files)} files in {len(repo_index.dirs)} directories")
+
+        job.set_step("Step 1/7: Detecting dependencies...")
+        dependencies = detect_dependencies(clone_dir, repo_index)
 
         # 2. Build comprehensive project context
-        logger.info(f"[{request_id}] Step 2/7: Building project context...")
-        project_context = build_project_context(clone_dir)
+        job.set_step("Step 2/7: Building project context...")
+        project_context = build_project_context(clone_dir, repo_index)
         
         # If README is empty/minimal, build context from file structure
         if len(project_context['readme'].strip()) < 100:
@@ -401,21 +525,17 @@ def ingest():
             all_folders = set()
             code_files_by_type = {}
             
-            for root, dirs, files in os.walk(clone_dir):
-                # Skip irrelevant dirs
-                dirs[:] = [d for d in dirs if d not in ['.git', 'node_modules', '__pycache__', 'Library', 'Temp', 'Logs', 'obj', 'bin', 'dist', 'build', '.next']]
-                
-                # Collect folder names
-                for d in dirs:
-                    all_folders.add(d)
-                
-                # Collect code files
-                for file in files:
-                    ext = os.path.splitext(file)[1]
-                    if ext in ['.cs', '.py', '.js', '.ts', '.java', '.cpp', '.c', '.go', '.rs', '.rb', '.php', '.swift', '.kt', '.scala']:
-                        if ext not in code_files_by_type:
-                            code_files_by_type[ext] = []
-                        code_files_by_type[ext].append(os.path.join(root, file))
+            # Skip irrelevant dirs
+            skip_dirs = ['__pycache__', 'Library', 'Temp', 'Logs', 'obj', 'bin', 'dist', 'build', '.next']
+            
+            # Collect folder names
+            for rel_dir in repo_index.iter_dirs(exclude_dirs=skip_dirs):
+                all_folders.add(os.path.basename(rel_dir))
+            
+            # Collect code files
+            code_exts = {'.cs', '.py', '.js', '.ts', '.java', '.cpp', '.c', '.go', '.rs', '.rb', '.php', '.swift', '.kt', '.scala'}
+            for entry in repo_index.iter_files(exclude_dirs=skip_dirs, exts=code_exts):
+                code_files_by_type.setdefault(entry.ext, []).append(repo_index.full_path(entry))
             
             # Generic folder pattern analysis - infer purpose from common patterns
             context_parts.append("\nProject Structure Analysis:")
@@ -455,20 +575,13 @@ def ingest():
             context_parts.append("\nDirectory Contents:")
             dir_stats = []
             for folder in folder_list[:30]:  # Top 30 folders
-                folder_path = None
                 # Find the folder in the clone_dir
-                for root, dirs, files in os.walk(clone_dir):
-                    if folder in dirs:
-                        folder_path = os.path.join(root, folder)
-                        break
+                folder_path = repo_index.find_dir(folder)
                 
                 if folder_path:
-                    try:
-                        file_count = sum([len(files) for _, _, files in os.walk(folder_path)])
-                        if file_count > 0:
-                            dir_stats.append(f"  • {folder}/ ({file_count} files)")
-                    except:
-                        pass
+                    file_count = repo_index.dir_file_counts.get(folder_path, 0)
+                    if file_count > 0:
+                        dir_stats.append(f"  • {folder}/ ({file_count} files)")
             
             for stat in sorted(dir_stats)[:20]:
                 context_parts.append(stat)
@@ -512,7 +625,7 @@ def ingest():
             logger.info(f"[{request_id}] Built intelligent synthetic context from repo analysis: {len(project_context['readme'])} chars, analyzed {total_code_read} code files")
         
         # 3. Extract repo name (clean it properly)
-        logger.info(f"[{request_id}] Step 3/7: Extracting repo name...")
+        job.set_step("Step 3/7: Extracting repo name...")
         raw_repo_name = repo_url.rstrip('/').split('/')[-1]
         if raw_repo_name.endswith('.git'):
             raw_repo_name = raw_repo_name[:-4]
@@ -521,56 +634,67 @@ def ingest():
         repo_name = raw_repo_name.lower().replace('_', '-').replace(' ', '-')
         logger.info(f"[{request_id}] Repo name: {raw_repo_name} -> {repo_name}")
         
-        # 4. Get project name and description from LLM
-        logger.info(f"[{request_id}] Step 4/7: Calling LLM for project name and description...")
-        project_info = get_project_name(project_context['readme'], raw_repo_name, llm)
-        
-        # 5. Get goal/purpose
-        logger.info(f"[{request_id}] Step 5/7: Calling LLM for project goal...")
-        description_obj = get_description(content=project_context['readme'], llm=llm)
-        goal = description_obj.description if description_obj else "A software project"
-
-        # 6. Get installation steps
-        logger.info(f"[{request_id}] Step 6/8: Calling LLM for installation steps...")
-        install_steps = get_install_process(dependencies, clone_dir, project_context, llm)
-
-        # 7. Get documentation pages (try deep analysis first, fallback to LLM)
-        logger.info(f"[{request_id}] Step 7/8: Generating documentation pages...")
-        pages = {}
-        use_deep_analysis = request.args.get('deep_analysis', 'false').lower() == 'true'
-        
-        if use_deep_analysis:
-            try:
-                logger.info(f"[{request_id}] Starting deep code analysis (tree-sitter + LLM)...")
-                full_repo_url = f"https://{repo_url}"
-                analysis_result = analysis.analyze_repo(full_repo_url, llm)
-                
-                # Extract pages from analysis result and validate quality
-                if analysis_result and 'pages' in analysis_result and len(analysis_result['pages']) > 0:
-                    pages = analysis_result['pages']
-                    logger.info(f"[{request_id}] Deep analysis returned {len(pages)} pages")
-                    
-                    # Check if the pages are just generic/placeholder content
-                    # Look for telltale signs of bad generation like "0 file(s)" or "0 function(s)"
-                    first_page_desc = next(iter(pages.values())) if pages else ""
-                    if "0 file(s)" in first_page_desc or "0 function(s)" in first_page_desc or len(pages) < 3:
-                        logger.warning(f"[{request_id}] Deep analysis returned low-quality pages (generic/placeholder content). Falling back to LLM.")
-                        pages = get_pages(project_context, dependencies, llm)
+        # 4-7. The LLM calls below only depend on project_context/dependencies, so fan them
+        # out together; llm_slots caps how many hit the shared Ollama endpoint at once,
+        # and each step is recorded as it finishes rather than when it is queued
+        def record_when_done(future, message):
+            future.add_done_callback(lambda _: job.set_step(message))
+            return future
+
+        job.set_step("Steps 4-7: Running LLM calls...")
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix=f'llm-{request_id}') as pool:
+            project_info_future = record_when_done(
+                pool.submit(call_llm, get_project_name, project_context['readme'], raw_repo_name, llm),
+                "Step 4/7: Project name and description done")
+            description_future = record_when_done(
+                pool.submit(call_llm, get_description, content=project_context['readme'], llm=llm),
+                "Step 5/7: Project goal done")
+            install_future = record_when_done(
+                pool.submit(call_llm, get_install_process, dependencies, clone_dir, project_context, llm),
+                "Step 6/7: Installation steps done")
+
+            # 7. Get documentation pages (try deep analysis first, fallback to LLM)
+            pages = {}
+
+            if use_deep_analysis:
+                try:
+                    logger.info(f"[{request_id}] Starting deep code analysis (tree-sitter + LLM)...")
+                    full_repo_url = f"https://{repo_url}"
+                    analysis_result = analysis.analyze_repo(full_repo_url, llm, clone_dir=clone_dir)
+
+                    # Extract pages from analysis result and validate quality
+                    if analysis_result and 'pages' in analysis_result and len(analysis_result['pages']) > 0:
+                        pages = analysis_result['pages']
+                        logger.info(f"[{request_id}] Deep analysis returned {len(pages)} pages")
+
+                        # Check if the pages are just generic/placeholder content
+                        # Look for telltale signs of bad generation like "0 file(s)" or "0 function(s)"
+                        first_page_desc = next(iter(pages.values())) if pages else ""
+                        if "0 file(s)" in first_page_desc or "0 function(s)" in first_page_desc or len(pages) < 3:
+                            logger.warning(f"[{request_id}] Deep analysis returned low-quality pages (generic/placeholder content). Falling back to LLM.")
+                            pages = call_llm(get_pages, project_context, dependencies, llm)
+                        else:
+                            logger.info(f"[{request_id}] ✓ Deep analysis generated {len(pages)} quality pages")
                     else:
-                        logger.info(f"[{request_id}] ✓ Deep analysis generated {len(pages)} quality pages")
-                else:
-                    logger.warning(f"[{request_id}] Deep analysis returned but no pages found")
-                    pages = get_pages(project_context, dependencies, llm)
-            except Exception as e:
-                logger.error(f"[{request_id}] Deep analysis failed: {e}", exc_info=True)
-                logger.info(f"[{request_id}] Falling back to standard LLM-based page generation")
-                pages = get_pages(project_context, dependencies, llm)
-        else:
-            logger.info(f"[{request_id}] Using standard LLM-based page generation (add ?deep_analysis=true for code analysis)")
-            pages = get_pages(project_context, dependencies, llm)
+                        logger.warning(f"[{request_id}] Deep analysis returned but no pages found")
+                        pages = call_llm(get_pages, project_context, dependencies, llm)
+                except Exception as e:
+                    logger.error(f"[{request_id}] Deep analysis failed: {e}", exc_info=True)
+                    logger.info(f"[{request_id}] Falling back to standard LLM-based page generation")
+                    pages = call_llm(get_pages, project_context, dependencies, llm)
+            else:
+                logger.info(f"[{request_id}] Using standard LLM-based page generation (add ?deep_analysis=true for code analysis)")
+                pages = pool.submit(call_llm, get_pages, project_context, dependencies, llm).result()
+            job.set_step("Step 7/7: Documentation pages done")
+
+            project_info = project_info_future.result()
+            description_obj = description_future.result()
+            goal = description_obj.description if description_obj else "A software project"
+            install_steps = install_future.result()
+            logger.info(f"[{request_id}] LLM calls finished")
 
         # 8. Construct the result
-        logger.info(f"[{request_id}] Constructing final result...")
+        job.set_step("Constructing final result...")
         result = SerializedDoc(
             repo_name=repo_name,
             name=project_info.name if project_info else raw_repo_name,
@@ -587,18 +711,29 @@ def ingest():
         # 9. Send to documentation generator API
         try:
             doc_gen_url = "http://204.52.26.255:8080/generate-docs"
-            logger.info(f"[{request_id}] Sending to documentation generator: {doc_gen_url}")
-            
-            # Increase timeout to 5 minutes for large documentation generation
-            resp = requests.post(
-                doc_gen_url,
-                json=result_dict,
-                timeout=300  # 5 minutes - doc generation can take a while
-            )
-            
+            job.set_step(f"Sending to documentation generator: {doc_gen_url}")
+
+            # Queue the build and poll it: a build waiting behind others can take longer than
+            # any single request should stay open
+            resp = requests.post(doc_gen_url, params={ 'wait': 'false' }, json=result_dict, timeout=60)
             logger.info(f"[{request_id}] Documentation generator response status: {resp.status_code}")
-            
-            if resp.status_code == 200:
+
+            if resp.status_code == 202:
+                build = wait_for_doc_build(urljoin(doc_gen_url, resp.json()['status_url']), job)
+                if build['status'] == 'succeeded':
+                    logger.info(f"[{request_id}] Documentation generated successfully!")
+                    result_dict['doc_generation'] = {
+                        'status': 'success',
+                        'response': build['result']
+                    }
+                else:
+                    logger.error(f"[{request_id}] Documentation build {build['job_id']} failed: {build['error']}")
+                    result_dict['doc_generation'] = {
+                        'status': 'error',
+                        'code': 400,
+                        'message': build['error']
+                    }
+            elif resp.status_code == 200:
                 try:
                     doc_response = resp.json()
                     logger.info(f"[{request_id}] Documentation generated successfully!")
@@ -629,37 +764,41 @@ def ingest():
             }
 
         logger.info(f"[{request_id}] Request completed successfully")
-        global db
-        db.update({ repo_name: result_dict })
-        return jsonify(result_dict)
+        db.put(repo_name, result_dict)
+        return result_dict
 
-    except Exception as e:
-        logger.error(f"[{request_id}] Error occurred during processing: {e}", exc_info=True)
-        return jsonify({ "msg": "An error occurred during processing.", "error": str(e)}), 500
     finally:
-        if os.path.isdir(clone_dir):
-            shutil.rmtree(clone_dir)
-            logger.info(f"[{request_id}] Cleaned up temporary directory: {clone_dir}")
+        checkout.release()
+        logger.info(f"[{request_id}] Released checkout: {clone_dir}")
 
 @app.route('/repos')
 def get_repos():
-    return jsonify(list(db.keys()))
+    # Most recently updated first; the total goes in X-Total-Count so the body stays a list of names
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({ 'error': 'limit and offset must be integers' }), 400
+
+    response = jsonify(db.list_names(offset=offset, limit=limit))
+    response.headers['X-Total-Count'] = str(db.count())
+    return response
 
 @app.route('/repo')
 def get_repo():
     repo = request.args.get('name')
 
-    if repo not in list(db.keys()):
+    doc = db.get(repo) if repo else None
+    if doc is None:
         return jsonify({ 'msg': f'{repo} not found' })
 
-    return jsonify(db.get(repo))
+    return jsonify(doc)
 
 def get_project_name(content: str, fallback_name: str, llm):
     """Extract a human-readable project name and description."""
     logger.info("LLM call: Extracting project name and description")
     logger.debug(f"Context length: {len(content)} chars")
     try:
-        structured_llm = llm.with_structured_output(ProjectName)
         prompt = ChatPromptTemplate.from_messages([
             ('system', '''You are a technical writer analyzing a real GitHub repository.
 
@@ -686,8 +825,7 @@ Examples:
 - Name: "TaskFlow Pro" / Description: "A collaborative task management web application built with React and Node.js. Features real-time updates, team workspaces, customizable workflows, and integration with popular productivity tools."'''),
             ('human', 'Project Content:\n{content}\n\nFallback name: {fallback}')
         ])
-        chain = prompt | structured_llm
-        response = chain.invoke({ 'content': content[:5000], 'fallback': fallback_name })
+        response = cached_invoke(llm, ProjectName, prompt, { 'content': content[:5000], 'fallback': fallback_name })
         logger.info(f"LLM response: name='{response.name}', description='{response.description[:100]}...'")
         return response
     except Exception as e:
@@ -703,7 +841,6 @@ def get_description(content: str, llm):
         logger.warning("WARNING: Content is empty or very short! LLM will struggle with this.")
         logger.warning(f"Content preview: '{content[:200]}'")
     
-    structured_llm = llm.with_structured_output(Description)
     prompt = ChatPromptTemplate.from_messages([
      ('system', '''You are a senior software engineer writing project documentation.
 
@@ -730,8 +867,7 @@ Example BAD descriptions (too generic):
 - "A web application using React"'''),
      ('human', '{content}'),
     ])
-    chain = prompt | structured_llm
-    response = chain.invoke({ 'content': content[:6000]})  # Increased from 4000 to give more context
+    response = cached_invoke(llm, Description, prompt, { 'content': content[:6000]})  # Increased from 4000 to give more context
     logger.info(f"LLM response: goal='{response.description[:100]}...'")
     return response
 
@@ -774,7 +910,6 @@ IMPORTANT: Generate 7-10 SPECIFIC sections based on what you see above. Each sec
         logger.debug(f"Context sent to LLM: {len(context_summary)} chars")
         logger.info(f"Asking LLM to generate pages with {len(project_context['readme'])} chars of readme, {len(project_context['file_structure'])} files, {len(dependencies)} dependencies")
         
-        structured_llm = llm.with_structured_output(Pages)
         prompt = ChatPromptTemplate.from_messages([
             ('system', '''You are a technical documentation architect analyzing a REAL repository.
 
@@ -820,10 +955,8 @@ For LIBRARIES/TOOLS:
 REMEMBER: Every description MUST reference specific files or directories from the repository!'''),
             ('human', '{context}')
         ])
-        chain = prompt | structured_llm
-        
         try:
-            response = chain.invoke({ 'context': context_summary })
+            response = cached_invoke(llm, Pages, prompt, { 'context': context_summary })
             logger.info(f"LLM response type: {type(response)}")
             logger.info(f"LLM response: {response}")
             
@@ -1050,7 +1183,6 @@ README Installation Section:
         
         logger.debug(f"Context sent to LLM: {len(context)} chars")
         
-        structured_llm = llm.with_structured_output(InstallProcess)
         prompt = ChatPromptTemplate.from_messages([
             ('system', '''You are a senior software engineer writing installation documentation for a REAL project.
 
@@ -1075,8 +1207,7 @@ Example BAD steps (too verbose):
 - "**1. Clone/Download the Repository** Using Git: Open your terminal..."'''),
             ('human', '{context}')
         ])
-        chain = prompt | structured_llm
-        response = chain.invoke({ 'context': context })
+        response = cached_invoke(llm, InstallProcess, prompt, { 'context': context })
         logger.info(f"LLM generated {len(response.installation)} installation steps")
         return response.installation
     except Exception as e:
@@ -1099,4 +1230,5 @@ Example BAD steps (too verbose):
         
         return steps
 
-app.run(debug=True, host='0.0.0.0', port=3333)
+if __name__ == '__main__':
+    create_app().run(debug=True, host='0.0.0.0', port=3333)
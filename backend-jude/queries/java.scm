@@ -0,0 +1,7 @@
+; Function definitions: @function is the definition node, @function.name its name.
+(method_declaration
+  name: (identifier) @function.name) @function
+
+; Calls: @call is the call node, @call.name the invoked method name.
+(method_invocation
+  name: (identifier) @call.name) @call
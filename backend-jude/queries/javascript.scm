@@ -0,0 +1,17 @@
+; Function definitions: @function is the definition node, @function.name its name.
+; Matches are ordered by pattern, so put definition patterns first, in the order
+; functions should appear in the graph.
+(function_declaration
+  name: (_) @function.name) @function
+
+(method_definition
+  name: (_) @function.name) @function
+
+; Arrow functions have no name field; the first bare identifier child
+; (e.g. the single parameter in `x => ...`) is used, as before.
+(arrow_function
+  (identifier) @function.name) @function
+
+; Calls: @call is the call node, @call.name the called identifier (member calls like a.b() are skipped).
+(call_expression
+  function: (identifier) @call.name) @call
@@ -0,0 +1,9 @@
+; Function definitions: @function is the definition node, @function.name its name.
+; Matches are ordered by pattern, so put definition patterns first, in the order
+; functions should appear in the graph.
+(function_definition
+  name: (identifier) @function.name) @function
+
+; Calls: @call is the call node, @call.name the called identifier (attribute calls like obj.m() are skipped).
+(call
+  function: (identifier) @call.name) @call
@@ -0,0 +1,254 @@
+import os
+import time
+import uuid
+import fcntl
+import shutil
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+import git
+
+logger = logging.getLogger(__name__)
+
+MIRROR_CACHE_DIR = os.getenv('MIRROR_CACHE_DIR', 'cache/mirrors')
+MIRROR_CACHE_MAX_MB = int(os.getenv('MIRROR_CACHE_MAX_MB', '10240'))
+CHECKOUT_DIR = os.getenv('CHECKOUT_DIR', 'tmp')
+
+
+def _lock_file(path: str, mode: int):
+    """Open and flock `path`, returning the open file.
+
+    evict() unlinks the lock files of the mirrors it deletes, so a lock won on a file that
+    has since been unlinked guards nothing; in that case start over on the new file.
+    """
+    while True:
+        f = open(path, 'a')
+        try:
+            fcntl.flock(f, mode)
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        except BaseException:
+            f.close()
+            raise
+        f.close()
+
+
+@contextmanager
+def _flock(path: str, mode: int):
+    f = _lock_file(path, mode)
+    try:
+        yield
+    finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class Checkout:
+    """A worktree checked out from a cached mirror. Call release() when done with it."""
+
+    def __init__(self, cache, url: str, mirror: str, path: str, use_lock):
+        self.cache = cache
+        self.url = url
+        self.mirror = mirror
+        self.path = path
+        self._use_lock = use_lock
+
+    def release(self):
+        if self._use_lock is None:
+            return
+        try:
+            self.cache._remove_worktree(self.mirror, self.path)
+        finally:
+            fcntl.flock(self._use_lock, fcntl.LOCK_UN)
+            self._use_lock.close()
+            self._use_lock = None
+
+
+class RepoMirrorCache:
+    """One bare mirror per repository URL, fetched incrementally, with cheap worktree checkouts.
+
+    Mirrors are shallow (depth 1): only the current tree is downloaded, not the history.
+    Each mirror has two lock files next to it: `<mirror>.lock` serializes clone/fetch and
+    worktree bookkeeping, and `<mirror>.use` is held shared for as long as a checkout is
+    alive so eviction (which needs it exclusively) never deletes a mirror in use. Both are
+    flock()s, so they also hold across worker processes. `<mirror>.size` records the
+    mirror's size after each clone/fetch; when the mirrors exceed max_bytes, the least
+    recently fetched ones are evicted.
+    """
+
+    def __init__(self, root: str, checkout_root: str, max_bytes: int):
+        self.root = root
+        self.checkout_root = checkout_root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(checkout_root, exist_ok=True)
+
+    def mirror_path(self, url: str) -> str:
+        normalized = url.strip().rstrip('/').removesuffix('.git').lower()
+        return os.path.join(self.root, hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:24] + '.git')
+
+    def acquire(self, url: str) -> Checkout:
+        """Fetch (or clone) the mirror for `url` and check its default branch out into a fresh worktree."""
+        mirror = self.mirror_path(url)
+        use_lock = _lock_file(f'{mirror}.use', fcntl.LOCK_SH)
+        try:
+            path = os.path.join(self.checkout_root, str(uuid.uuid4()))
+            with _flock(f'{mirror}.lock', fcntl.LOCK_EX):
+                self._update_mirror(url, mirror, use_lock)
+                git.Repo(mirror).git.worktree('add', '--detach', os.path.abspath(path), 'HEAD')
+                os.utime(mirror)
+        except Exception:
+            fcntl.flock(use_lock, fcntl.LOCK_UN)
+            use_lock.close()
+            raise
+
+        try:
+            self.evict(keep=mirror)
+        except Exception as e:
+            logger.warning(f"Mirror cache eviction failed: {e}")
+        return Checkout(self, url, mirror, path, use_lock)
+
+    @contextmanager
+    def checkout(self, url: str):
+        checkout = self.acquire(url)
+        try:
+            yield checkout.path
+        finally:
+            checkout.release()
+
+    def _update_mirror(self, url: str, mirror: str, use_lock):
+        """Bring the mirror up to date. Caller holds `<mirror>.lock` and `use_lock` shared."""
+        if os.path.isdir(mirror):
+            try:
+                repo = git.Repo(mirror)
+                branch_ref = repo.git.symbolic_ref('HEAD')
+                start = time.time()
+                repo.git.fetch('--prune', '--depth=1', 'origin', f'+HEAD:{branch_ref}')
+                logger.info(f"Fetched {url} into mirror in {time.time() - start:.1f}s")
+                self._record_size(mirror)
+                return
+            except Exception as e:
+                if self._mirror_ok(mirror):
+                    # Network hiccup or remote error: the objects we already have are still good
+                    logger.warning(f"Fetch of mirror for {url} failed ({e}), using the cached copy")
+                    return
+                self._recreate_mirror(url, mirror, use_lock, e)
+                return
+
+        self._clone(url, mirror)
+
+    def _clone(self, url: str, mirror: str):
+        start = time.time()
+        git.Repo.clone_from(url, mirror, bare=True, single_branch=True, depth=1)
+        logger.info(f"Cloned {url} into new mirror {mirror} in {time.time() - start:.1f}s")
+        self._record_size(mirror)
+
+    def _record_size(self, mirror: str):
+        # Measured once per fetch so evict() never has to walk every mirror
+        with open(f'{mirror}.size', 'w') as f:
+            f.write(str(_dir_size(mirror)))
+
+    def _mirror_size(self, mirror: str) -> int:
+        try:
+            with open(f'{mirror}.size') as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return _dir_size(mirror)
+
+    def _mirror_ok(self, mirror: str) -> bool:
+        try:
+            git.Repo(mirror).git.rev_parse('--verify', 'HEAD')
+            return True
+        except Exception:
+            return False
+
+    def _recreate_mirror(self, url: str, mirror: str, use_lock, error: Exception):
+        """Delete and re-clone a corrupt mirror, but only if no other checkout is using it."""
+        # Upgrade our shared hold to exclusive. Never block here: an evict() holding `.use`
+        # exclusively would be waiting on the `.lock` we hold. A failed upgrade may drop our
+        # shared lock; that's fine because acquire() releases it anyway when we raise.
+        try:
+            fcntl.flock(use_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RuntimeError(f"Mirror for {url} is corrupt but still in use; not re-cloning") from error
+        try:
+            logger.warning(f"Mirror for {url} is corrupt ({error}), re-cloning")
+            shutil.rmtree(mirror, ignore_errors=True)
+            self._clone(url, mirror)
+        finally:
+            fcntl.flock(use_lock, fcntl.LOCK_SH)
+
+    def _remove_worktree(self, mirror: str, path: str):
+        with _flock(f'{mirror}.lock', fcntl.LOCK_EX):
+            try:
+                git.Repo(mirror).git.worktree('remove', '--force', os.path.abspath(path))
+            except Exception as e:
+                logger.warning(f"Could not remove worktree {path}: {e}")
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            try:
+                git.Repo(mirror).git.worktree('prune')
+            except Exception:
+                pass
+
+    def evict(self, keep: str = None):
+        """Delete least recently used mirrors until the cache fits in max_bytes."""
+        mirrors = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith('.git') and os.path.isdir(path):
+                mirrors.append((os.stat(path).st_mtime, path, self._mirror_size(path)))
+        total = sum(size for _, _, size in mirrors)
+        if total <= self.max_bytes:
+            return
+
+        for _, path, size in sorted(mirrors):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                use_lock = _lock_file(f'{path}.use', fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # checked out right now
+            try:
+                with _flock(f'{path}.lock', fcntl.LOCK_EX):
+                    shutil.rmtree(path, ignore_errors=True)
+                    for suffix in ('.size', '.lock', '.use'):
+                        try:
+                            os.remove(f'{path}{suffix}')
+                        except FileNotFoundError:
+                            pass
+                total -= size
+                logger.info(f"Evicted mirror {path} ({size // (1024 * 1024)} MB)")
+            finally:
+                fcntl.flock(use_lock, fcntl.LOCK_UN)
+                use_lock.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_repo_cache() -> RepoMirrorCache:
+    """Process-wide mirror cache configured from the MIRROR_CACHE_* env vars."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = RepoMirrorCache(MIRROR_CACHE_DIR, CHECKOUT_DIR, MIRROR_CACHE_MAX_MB * 1024 * 1024)
+        return _default_cache
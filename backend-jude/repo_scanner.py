@@ -0,0 +1,109 @@
+import os
+from typing import NamedTuple, Tuple
+
+# Never worth descending into; everything else is indexed and filtered per query
+ALWAYS_SKIP_DIRS = {'.git', 'node_modules'}
+
+
+class FileEntry(NamedTuple):
+    path: str            # relative to the repo root, os.sep separated
+    dir: str             # relative directory ('' for the root)
+    name: str
+    ext: str             # as in the filename (case not normalized), e.g. '.py'
+    size: int
+    depth: int           # number of directories between the root and the file
+    parts: Tuple[str, ...]  # directory components of `dir`
+
+
+class RepoIndex:
+    """In-memory index of a checkout built from a single os.walk.
+
+    Holds every file (path, size, extension, depth) plus every directory in walk
+    order with its recursive file count, so the dependency detection and context
+    building passes can query it instead of walking/globbing the tree again.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.files = []
+        self.dirs = []
+        self.dir_file_counts = {}
+        self._paths = set()
+
+    @classmethod
+    def scan(cls, root: str, skip_dirs=ALWAYS_SKIP_DIRS) -> 'RepoIndex':
+        index = cls(root)
+        for current, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if d not in skip_dirs]
+            # A worktree checkout has a `.git` *file* pointing at its mirror; skip that too
+            files = [f for f in files if f not in skip_dirs]
+            rel_dir = os.path.relpath(current, root)
+            if rel_dir == '.':
+                rel_dir = ''
+            parts = tuple(rel_dir.split(os.sep)) if rel_dir else ()
+            if rel_dir:
+                index.dirs.append(rel_dir)
+
+            for name in files:
+                rel_path = os.path.join(rel_dir, name) if rel_dir else name
+                try:
+                    size = os.lstat(os.path.join(current, name)).st_size
+                except OSError:
+                    size = 0
+                index.files.append(FileEntry(
+                    path=rel_path, dir=rel_dir, name=name, ext=os.path.splitext(name)[1],
+                    size=size, depth=len(parts), parts=parts
+                ))
+                index._paths.add(rel_path)
+
+            # Recursive counts: credit this directory and every ancestor
+            if files:
+                for i in range(len(parts) + 1):
+                    key = os.sep.join(parts[:i])
+                    index.dir_file_counts[key] = index.dir_file_counts.get(key, 0) + len(files)
+        return index
+
+    def full_path(self, entry_or_path) -> str:
+        rel = entry_or_path.path if isinstance(entry_or_path, FileEntry) else entry_or_path
+        return os.path.join(self.root, rel)
+
+    def has_file(self, rel_path: str) -> bool:
+        return rel_path in self._paths
+
+    def iter_files(self, exclude_dirs=(), exts=None, names=None, max_depth=None, include_hidden=True):
+        """Yield files in walk order, skipping any under a directory named in `exclude_dirs`.
+
+        include_hidden=False mirrors glob('**') semantics: nothing under a dot-directory
+        and no dot-files.
+        """
+        exclude_dirs = set(exclude_dirs)
+        for entry in self.files:
+            if max_depth is not None and entry.depth > max_depth:
+                continue
+            if exts is not None and entry.ext not in exts:
+                continue
+            if names is not None and entry.name not in names:
+                continue
+            if exclude_dirs and not exclude_dirs.isdisjoint(entry.parts):
+                continue
+            if not include_hidden and (entry.name.startswith('.') or any(p.startswith('.') for p in entry.parts)):
+                continue
+            yield entry
+
+    def iter_dirs(self, exclude_dirs=()):
+        """Yield directories in walk order, skipping excluded ones and anything beneath them."""
+        exclude_dirs = set(exclude_dirs)
+        for rel_dir in self.dirs:
+            if exclude_dirs.isdisjoint(rel_dir.split(os.sep)):
+                yield rel_dir
+
+    def find_dir(self, name: str):
+        """First directory (in walk order) whose basename is `name`, or None."""
+        for rel_dir in self.dirs:
+            if os.path.basename(rel_dir) == name:
+                return rel_dir
+        return None
+
+
+def scan_repo(root: str) -> RepoIndex:
+    return RepoIndex.scan(root)
@@ -0,0 +1,111 @@
+import pytest
+
+from analysis import (
+    LANGUAGE_CONFIG, Snippet, collect_functions, collect_functions_query, extract_functions,
+    get_function_name, group_by_snippet, load_query,
+)
+
+
+def test_group_by_snippet_normalizes_whitespace_and_newlines():
+    functions = {
+        'a.py::f': {"code_snippet": "def f():\n    return 1\n"},
+        'b.py::f': {"code_snippet": "  def f():   \r\n    return 1\r\n\n"},
+        'c.py::f': {"code_snippet": "def f():\r    return 1"},
+        'd.py::g': {"code_snippet": "def f():\n        return 1"},
+        'e.py::h': {"code_snippet": "def h():\n    return 1"},
+    }
+    groups = group_by_snippet(list(functions), functions)
+    assert groups == [['a.py::f', 'b.py::f', 'c.py::f'], ['d.py::g'], ['e.py::h']]
+
+
+def test_group_by_snippet_reads_lazy_snippets(tmp_path):
+    source = b"def f():\r\n    return 1\r\n\ndef g():\n    return 1\n"
+    path = tmp_path / "m.py"
+    path.write_bytes(source)
+    functions = {
+        'm.py::f': {"code_snippet": Snippet(str(path), 0, source.index(b"\r\n\n"))},
+        'n.py::f': {"code_snippet": "def f():\n    return 1"},
+        'm.py::g': {"code_snippet": Snippet(str(path), source.index(b"def g"), len(source))},
+    }
+    assert group_by_snippet(list(functions), functions) == [['m.py::f', 'n.py::f'], ['m.py::g']]
+
+
+SOURCES = {
+    'python': b'''
+import os
+
+def outer(x):
+    helper(x)
+    def inner():
+        os.path.join("a", "b")
+        return nested(helper(1))
+    return inner()
+
+class C:
+    def method(self):
+        self.other()
+        print(outer(2))
+
+def helper(y):
+    return y
+''',
+    'javascript': b'''
+function top(a) {
+  const cb = (x) => compute(x);
+  return run(cb, other(a));
+}
+
+class K {
+  method() { this.go(); return top(1); }
+}
+
+const arrow = async () => { await fetch("/x"); };
+items.map(item => render(item));
+''',
+    'java': b'''
+class A {
+  void first() { second(); System.out.println(third(1)); }
+  int second() { return helper.call(); }
+}
+''',
+}
+
+
+@pytest.mark.parametrize("lang", sorted(SOURCES))
+def test_query_extraction_matches_tree_walk(lang):
+    tree_sitter = pytest.importorskip("tree_sitter")
+    conf = LANGUAGE_CONFIG[lang]
+    grammar = pytest.importorskip(f"tree_sitter_{conf['grammar_name']}")
+    language = tree_sitter.Language(grammar.language())
+    query = load_query(language, conf['grammar_name'])
+    assert query is not None
+    root = tree_sitter.Parser(language).parse(SOURCES[lang]).root_node
+
+    func_node_types = conf.get('function_node_types', [conf.get('function_node_type')])
+    walked = {}
+    for node, calls in collect_functions(root, func_node_types, conf['call_node_type'], conf['call_function_field']):
+        name = get_function_name(node, conf['function_name_field'])
+        if name:  # unnamed definitions are dropped by extract_functions
+            walked[name] = calls
+    queried = {name: calls for _, name, calls in collect_functions_query(root, query)}
+    assert queried.keys() == walked.keys()
+    for name in walked:
+        assert list(dict.fromkeys(queried[name])) == list(dict.fromkeys(walked[name])), name
+
+
+def test_calls_are_attributed_to_every_enclosing_function(tmp_path):
+    tree_sitter = pytest.importorskip("tree_sitter")
+    grammar = pytest.importorskip("tree_sitter_python")
+    language = tree_sitter.Language(grammar.language())
+    conf = dict(LANGUAGE_CONFIG['python'], query=load_query(language, 'python'))
+    path = tmp_path / "m.py"
+    path.write_bytes(SOURCES['python'])
+
+    functions = extract_functions(str(path), SOURCES['python'], tree_sitter.Parser(language), conf)
+    assert list(functions) == ['outer', 'inner', 'method', 'helper']
+    # Attribute calls (os.path.join, self.other) are not extracted
+    assert functions['inner']['calls'] == ['nested', 'helper']
+    assert functions['outer']['calls'] == ['helper', 'nested', 'inner']
+    assert functions['method']['calls'] == ['print', 'outer']
+    assert functions['helper']['calls'] == []
+    assert functions['method']['code_snippet'].text().startswith('def method(self):')
@@ -0,0 +1,62 @@
+import os
+
+from repo_scanner import RepoIndex, scan_repo
+
+
+def make_tree(root, paths):
+    for rel in paths:
+        path = os.path.join(root, *rel.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(rel)
+
+
+def test_scan_skips_git_and_node_modules(tmp_path):
+    make_tree(tmp_path, [
+        'setup.py', '.git', 'src/app.py', 'src/.git/HEAD',
+        'node_modules/pkg/index.js', 'web/node_modules/x.js', 'web/App.TSX',
+    ])
+    index = scan_repo(str(tmp_path))
+    assert sorted(e.path for e in index.files) == sorted(
+        ['setup.py', os.path.join('src', 'app.py'), os.path.join('web', 'App.TSX')])
+    assert set(index.dirs) == {'src', 'web'}
+
+
+def test_entries_and_counts(tmp_path):
+    make_tree(tmp_path, ['a.py', 'pkg/b.py', 'pkg/sub/C.PY', 'pkg/sub/d.txt'])
+    index = RepoIndex.scan(str(tmp_path))
+    entry = next(e for e in index.files if e.name == 'C.PY')
+    assert entry.ext == '.PY'
+    assert entry.dir == os.path.join('pkg', 'sub')
+    assert entry.parts == ('pkg', 'sub')
+    assert entry.depth == 2
+    assert entry.size == len('pkg/sub/C.PY')
+    assert index.full_path(entry) == os.path.join(str(tmp_path), 'pkg', 'sub', 'C.PY')
+    assert index.has_file(os.path.join('pkg', 'b.py'))
+    assert not index.has_file('b.py')
+    assert index.dir_file_counts == {'': 4, 'pkg': 3, os.path.join('pkg', 'sub'): 2}
+
+
+def test_iter_files_filters(tmp_path):
+    make_tree(tmp_path, [
+        'main.py', 'README.md', '.env', 'tests/test_x.py', 'build/gen.py', '.github/ci.py', 'a/b/c/deep.py',
+    ])
+    index = RepoIndex.scan(str(tmp_path))
+
+    def paths(**kwargs):
+        return sorted(e.path.replace(os.sep, '/') for e in index.iter_files(**kwargs))
+
+    assert paths(exts={'.py'}, exclude_dirs={'build', 'tests'}) == ['.github/ci.py', 'a/b/c/deep.py', 'main.py']
+    assert paths(names={'README.md', '.env'}) == ['.env', 'README.md']
+    assert paths(max_depth=0) == ['.env', 'README.md', 'main.py']
+    assert paths(exts={'.py'}, include_hidden=False) == [
+        'a/b/c/deep.py', 'build/gen.py', 'main.py', 'tests/test_x.py']
+
+
+def test_dirs(tmp_path):
+    make_tree(tmp_path, ['docs/x.md', 'src/docs/y.md', 'src/lib/z.py', 'build/out/w.js'])
+    index = RepoIndex.scan(str(tmp_path))
+    assert sorted(index.iter_dirs(exclude_dirs={'build'})) == sorted(
+        ['docs', 'src', os.path.join('src', 'docs'), os.path.join('src', 'lib')])
+    assert index.find_dir('docs') in ('docs', os.path.join('src', 'docs'))
+    assert index.find_dir('missing') is None
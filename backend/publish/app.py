@@ -1,10 +1,14 @@
 # app.py
-import os, json, re, subprocess, shutil, socket, logging
+import os, json, re, subprocess, shutil, socket, logging, time, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Dict, Any
 from flask import Flask, request, jsonify
 import requests
 from portmap import PortMap
+from build_queue import BuildQueue, QueueFull
+from npm_client import NPMClient
+from mdx_sanitizer import sanitize_page
 
 # Setup logging
 logging.basicConfig(
@@ -36,6 +40,38 @@ NPM_HOST      = os.getenv("NPM_HOST", "http://npm-server.example.com")  # NPM se
 NPM_EMAIL     = os.getenv("NPM_EMAIL", "admin@example.com")
 NPM_PASSWORD  = os.getenv("NPM_PASSWORD", "changeme")
 DOCS_SERVER_IP = os.getenv("DOCS_SERVER_IP", "127.0.0.1")  # This server's IP that NPM will forward to
+NPM_INDEX_TTL = float(os.getenv("NPM_INDEX_TTL", "3600"))  # seconds before cached proxy hosts/certs are re-fetched
+
+# Doc generation: "per_page" (one request per page, concurrently) or "bundle" (one request for all pages)
+DOCS_GENERATION_MODE = os.getenv("DOCS_GENERATION_MODE", "per_page").lower()
+OLLAMA_PAGE_CONCURRENCY = int(os.getenv("OLLAMA_PAGE_CONCURRENCY", "4"))
+OLLAMA_PAGE_TIMEOUT = float(os.getenv("OLLAMA_PAGE_TIMEOUT", "180"))
+OLLAMA_PAGE_RETRIES = int(os.getenv("OLLAMA_PAGE_RETRIES", "2"))
+# Per-page mode fails the publish if fewer than this share of the requested pages come back
+OLLAMA_PAGE_MIN_SUCCESS = float(os.getenv("OLLAMA_PAGE_MIN_SUCCESS", "0.5"))
+# Bundle mode: stream the response and write each page as soon as its JSON object closes
+OLLAMA_STREAM = os.getenv("OLLAMA_STREAM", "true").lower() == "true"
+
+# Shared base image with the Docusaurus toolchain and node_modules pre-installed
+DOCS_BASE_IMAGE = os.getenv("DOCS_BASE_IMAGE", "docusite-base")
+
+# Hosting: "container" (one http-server container + port per site) or
+# "shared" (static builds under SITES_ROOT/_www served by one nginx, routed by Host header)
+HOSTING_MODE  = os.getenv("HOSTING_MODE", "container").lower()
+SHARED_SERVER_PORT = int(os.getenv("SHARED_SERVER_PORT", "18000"))
+SHARED_SERVER_CONTAINER = os.getenv("SHARED_SERVER_CONTAINER", "docusite_shared")
+SHARED_SERVER_IMAGE = os.getenv("SHARED_SERVER_IMAGE", "nginx:1.27-alpine")
+WWW_ROOT      = SITES_ROOT / "_www"
+
+# Build scheduler: concurrent builds (never two for one slug) and slugs allowed to wait
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", "2"))
+BUILD_QUEUE_SIZE = int(os.getenv("BUILD_QUEUE_SIZE", "32"))
+BUILD_WAIT_TIMEOUT = float(os.getenv("BUILD_WAIT_TIMEOUT", "600"))  # how long a waiting request blocks
+
+# Build: "docker" (docker build per site) or "host" (docusaurus build on this machine
+# against a warm workspace with node_modules already installed; needs node/npm)
+BUILD_MODE    = os.getenv("BUILD_MODE", "docker").lower()
+DOCS_WORKSPACE = SITES_ROOT / ".workspace"
 
 logger.info(f"Config loaded:")
 logger.info(f"  OLLAMA_MODEL: {OLLAMA_MODEL}")
@@ -44,9 +80,12 @@ logger.info(f"  SITES_ROOT: {SITES_ROOT}")
 logger.info(f"  BASE_DOMAIN: {BASE_DOMAIN}")
 logger.info(f"  NPM_ENABLED: {NPM_ENABLED}")
 logger.info(f"  DOCS_SERVER_IP: {DOCS_SERVER_IP}")
+logger.info(f"  DOCS_GENERATION_MODE: {DOCS_GENERATION_MODE} (page concurrency {OLLAMA_PAGE_CONCURRENCY})")
+logger.info(f"  HOSTING_MODE: {HOSTING_MODE}, BUILD_MODE: {BUILD_MODE}")
 
 app = Flask(__name__)
 ports = PortMap(SITES_ROOT / ".ports.json", base=18080, limit=2000)
+npm = NPMClient(NPM_HOST, NPM_EMAIL, NPM_PASSWORD, index_ttl=NPM_INDEX_TTL)
 
 def slugify(s: str) -> str:
     s = s.strip().lower()
@@ -110,8 +149,7 @@ def ensure_net(name: str):
     if res.returncode != 0:
         subprocess.check_call(["docker", "network", "create", name])
 
-def call_ollama(payload: Dict[str, Any]) -> Dict[str, Any]:
-    system_prompt = """You are a precise Docusaurus documentation generator. 
+DOCS_SYSTEM_PROMPT = """You are a precise Docusaurus documentation generator. 
     
 CRITICAL RULES:
 1. Output ONLY valid JSON - no markdown, no code fences, no commentary
@@ -145,10 +183,11 @@ JSON SCHEMA (FOLLOW EXACTLY):
   ]
 }"""
 
-    # Build file list from pages input
-    pages = payload.get('pages', {})
-    
-    # CRITICAL: Filter out junk page names before processing
+PAGE_SYSTEM_PROMPT = DOCS_SYSTEM_PROMPT.split("JSON SCHEMA (FOLLOW EXACTLY):")[0] + """JSON SCHEMA (FOLLOW EXACTLY) - ONE file object, nothing else:
+{"path": "docs/intro.md", "content": "---\\nid: intro\\ntitle: Introduction\\nsidebar_position: 1\\n---\\n\\n# Title\\n\\nContent here"}"""
+
+def filter_valid_pages(pages: Dict[str, str]) -> Dict[str, str]:
+    """Drop junk page names the upstream LLM sometimes produces."""
     valid_pages = {}
     for page_name, page_desc in pages.items():
         if is_valid_page_name(page_name):
@@ -158,38 +197,18 @@ JSON SCHEMA (FOLLOW EXACTLY):
     
     if not valid_pages:
         raise ValueError("No valid pages found after filtering. Check your 'pages' input.")
-    
-    pages = valid_pages  # Use only valid pages
-    file_instructions = []
-    for i, (page_name, page_desc) in enumerate(pages.items(), 1):
-        clean_name = clean_page_name(page_name)
-        file_slug = slugify(clean_name)
-        file_instructions.append(f"""
-{i}. docs/{file_slug}.md (id: {file_slug}, sidebar_position: {i})
-   Page Title: "{clean_name}"
-   Content Focus: {page_desc}
-   - Use project info to create relevant content
-   - Include code examples where appropriate
-   - Make it comprehensive and useful""")
-
-    user_prompt = f"""Generate Docusaurus documentation for this project:
+    return valid_pages
 
-PROJECT INFO:
+def project_info_prompt(payload: Dict[str, Any]) -> str:
+    return f"""PROJECT INFO:
 - Name: {payload.get('name')}
 - Description: {payload.get('description')}
 - Goal: {payload.get('goal')}
 - Dependencies: {', '.join(payload.get('dependencies', []))}
-- Installation Steps: {', '.join(payload.get('installation', []))}
+- Installation Steps: {', '.join(payload.get('installation', []))}"""
 
-CREATE EXACTLY {len(pages)} FILES - NO MORE, NO LESS:
-{''.join(file_instructions)}
-
-CRITICAL INSTRUCTIONS:
-- Create ONLY the {len(pages)} files listed above - DO NOT create any additional files
-- DO NOT create extra files like "title.md" or duplicate "introduction.md"
-- The file list above is COMPLETE and EXHAUSTIVE
-- First file ({clean_page_name(list(pages.keys())[0])}) is the HOMEPAGE - don't create a separate title page
-- Use YAML front matter: id, title, sidebar_position (plain text only, no markdown)
+def content_requirements_prompt(payload: Dict[str, Any]) -> str:
+    return f"""- Use YAML front matter: id, title, sidebar_position (plain text only, no markdown)
 - CONTENT REQUIREMENTS:
   * Write FOCUSED, PROFESSIONAL documentation - quality over quantity
   * Each section should have 2-3 paragraphs of useful, specific content (avoid fluff)
@@ -200,10 +219,10 @@ CRITICAL INSTRUCTIONS:
   * Infer details from tech stack - Unity→GameObjects/Scenes, React→Components, etc.
   * BE SPECIFIC - use project name, dependencies, installation steps
   * KEEP IT CONCISE - focus on quality, not length
-- Use Markdown formatting (headers, lists, links, code blocks)
-
-OUTPUT: JSON with "files" array containing EXACTLY {len(pages)} file objects. No other text."""
+- Use Markdown formatting (headers, lists, links, code blocks)"""
 
+def ollama_chat(system_prompt: str, user_prompt: str, timeout: float) -> str:
+    """One non-streaming /api/chat call in JSON mode; returns the message content."""
     r = requests.post(OLLAMA_URL, json={
         "model": OLLAMA_MODEL,
         "messages": [
@@ -212,10 +231,266 @@ OUTPUT: JSON with "files" array containing EXACTLY {len(pages)} file objects. No
         ],
         "format":"json",
         "stream":False
-    }, timeout=240)  # Increased timeout to 240 seconds (4 minutes)
+    }, timeout=timeout)
     r.raise_for_status()
     content = r.json().get("message",{}).get("content")
     if not content: raise RuntimeError("Ollama returned empty content")
+    return content
+
+def ollama_chat_stream(system_prompt: str, user_prompt: str, timeout: float):
+    """Streaming /api/chat call in JSON mode; yields content deltas as Ollama produces them.
+
+    `timeout` bounds the connect and each read, not the whole generation.
+    """
+    with requests.post(OLLAMA_URL, json={
+        "model": OLLAMA_MODEL,
+        "messages": [
+            {"role":"system","content":system_prompt},
+            {"role":"user","content":user_prompt}
+        ],
+        "format":"json",
+        "stream":True
+    }, timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            if not line: continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise RuntimeError(f"Ollama stream error: {chunk['error']}")
+            delta = chunk.get("message", {}).get("content")
+            if delta: yield delta
+            if chunk.get("done"): return
+
+class FilesStreamParser:
+    """Incrementally pulls complete objects out of a streamed {"files": [ {...}, ... ]} document.
+
+    feed() takes raw text as it arrives and returns every file object whose closing brace
+    has been seen, so pages can be written before the rest of the response exists. Only
+    objects that are direct children of an array under the root object are emitted.
+    """
+
+    def __init__(self):
+        self.text = ""      # unconsumed tail of the stream
+        self.start = 0      # absolute offset of self.text[0]
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.obj_start = None
+
+    def feed(self, chunk: str):
+        out = []
+        base = self.start + len(self.text)
+        self.text += chunk
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escape: self.escape = False
+                elif ch == "\\": self.escape = True
+                elif ch == '"': self.in_string = False
+                continue
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.stack.append(ch)
+                if ch == "{" and self.stack == ["{", "[", "{"]:
+                    self.obj_start = base + i
+            elif ch in "}]":
+                if self.stack: self.stack.pop()
+                if ch == "}" and self.stack == ["{", "["] and self.obj_start is not None:
+                    raw = self.text[self.obj_start - self.start:base + i + 1 - self.start]
+                    self.obj_start = None
+                    try:
+                        out.append(json.loads(raw))
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Skipping unparseable streamed file object: {e}")
+        # Nothing before the currently open object is needed again
+        keep_from = self.obj_start if self.obj_start is not None else base + len(chunk)
+        self.text = self.text[keep_from - self.start:]
+        self.start = keep_from
+        return out
+
+def validate_file_objects(files):
+    for i, f in enumerate(files):
+        if isinstance(f, str):
+            logger.error(f"File {i} is a string, not an object: {f[:100]}")
+            raise RuntimeError(f"File {i} is malformed - expected object with 'path' and 'content'")
+        if not isinstance(f, dict):
+            raise RuntimeError(f"File {i} is not a dict: {type(f)}")
+        if "path" not in f or "content" not in f:
+            raise RuntimeError(f"File {i} missing required keys. Has: {list(f.keys())}")
+
+def filter_expected_files(files, pages: dict):
+    """Keep only docs/<slug>.md files for the requested pages (drops hallucinated extras)."""
+    expected_slugs = set(slugify(clean_page_name(page_name)) for page_name in pages.keys())
+    filtered_files = []
+    for f in files:
+        path = f.get("path", "")
+        # Extract slug from path (e.g., "docs/introduction.md" -> "introduction")
+        if path.startswith("docs/") and path.endswith(".md"):
+            file_slug = path[5:-3]  # Remove "docs/" prefix and ".md" suffix
+            if file_slug in expected_slugs:
+                filtered_files.append(f)
+            else:
+                logger.warning(f"Filtering out unexpected file: {path} (slug: {file_slug})")
+    if len(filtered_files) < len(files):
+        logger.info(f"Filtered {len(files) - len(filtered_files)} unexpected files. Kept {len(filtered_files)} expected files.")
+    return filtered_files
+
+def generate_page(payload: Dict[str, Any], pages: dict, page_name: str, page_desc: str, position: int) -> Dict[str, str]:
+    """Ask the model for a single docs page, retrying on failure. Returns {"path", "content"}."""
+    clean_name = clean_page_name(page_name)
+    file_slug = slugify(clean_name)
+    expected_path = f"docs/{file_slug}.md"
+    other_pages = ", ".join(clean_page_name(p) for p in pages if p != page_name) or "none"
+    homepage_note = ("This page is the HOMEPAGE of the site - introduce the project as a whole."
+                     if position == 1 else "This page is NOT the homepage.")
+
+    user_prompt = f"""Generate ONE Docusaurus documentation page for this project:
+
+{project_info_prompt(payload)}
+
+PAGE TO CREATE:
+{expected_path} (id: {file_slug}, sidebar_position: {position})
+   Page Title: "{clean_name}"
+   Content Focus: {page_desc}
+   - Use project info to create relevant content
+   - Include code examples where appropriate
+   - Make it comprehensive and useful
+{homepage_note}
+Other pages in the site (do NOT write them, link to them only if useful): {other_pages}
+
+CRITICAL INSTRUCTIONS:
+{content_requirements_prompt(payload)}
+
+OUTPUT: JSON object with "path" ("{expected_path}") and "content". No other text."""
+
+    last_error = None
+    for attempt in range(OLLAMA_PAGE_RETRIES + 1):
+        try:
+            content = ollama_chat(PAGE_SYSTEM_PROMPT, user_prompt, timeout=OLLAMA_PAGE_TIMEOUT)
+            obj = json.loads(content)
+            # Tolerate the bundle shape too: {"files": [{...}]}
+            if isinstance(obj, dict) and isinstance(obj.get("files"), list) and obj["files"]:
+                obj = obj["files"][0]
+            validate_file_objects([obj])
+            if not str(obj["content"]).strip():
+                raise RuntimeError("empty page content")
+            return {"path": expected_path, "content": obj["content"]}
+        except Exception as e:
+            last_error = e
+            if attempt < OLLAMA_PAGE_RETRIES:
+                delay = 2 ** attempt
+                logger.warning(f"Page '{clean_name}' attempt {attempt + 1} failed ({e}), retrying in {delay}s")
+                time.sleep(delay)
+    raise RuntimeError(f"Page '{clean_name}' failed after {OLLAMA_PAGE_RETRIES + 1} attempts: {last_error}")
+
+def call_ollama_per_page(payload: Dict[str, Any], pages: dict, on_file=None, skip=()) -> Dict[str, Any]:
+    """One request per page, at most OLLAMA_PAGE_CONCURRENCY in flight; failed pages are left out.
+
+    on_file(file) is called for each page as soon as it is generated. Pages whose slug is
+    in `skip` are not requested. Raises if no requested page (or fewer than
+    OLLAMA_PAGE_MIN_SUCCESS of them) could be generated, e.g. when Ollama is down.
+    """
+    files_by_position = {}
+    with ThreadPoolExecutor(max_workers=OLLAMA_PAGE_CONCURRENCY) as pool:
+        futures = {
+            pool.submit(generate_page, payload, pages, page_name, page_desc, i): (i, page_name)
+            for i, (page_name, page_desc) in enumerate(pages.items(), 1)
+            if slugify(clean_page_name(page_name)) not in skip
+        }
+        for future in as_completed(futures):
+            position, page_name = futures[future]
+            try:
+                files_by_position[position] = future.result()
+                logger.info(f"Generated page {position}/{len(pages)}: {page_name}")
+            except Exception as e:
+                logger.error(f"Giving up on page '{page_name}': {e}")
+                continue
+            if on_file: on_file(files_by_position[position])
+
+    if futures and (not files_by_position or len(files_by_position) < OLLAMA_PAGE_MIN_SUCCESS * len(futures)):
+        raise RuntimeError(f"Only {len(files_by_position)} of {len(futures)} pages could be generated")
+
+    files = [files_by_position[i] for i in sorted(files_by_position)]
+    logger.info(f"Files to be created: {[f.get('path') for f in files]}")
+    return {"files": files, "cleaned_pages": pages}
+
+def bundle_user_prompt(payload: Dict[str, Any], pages: dict, skip=()) -> str:
+    file_instructions = []
+    for i, (page_name, page_desc) in enumerate(pages.items(), 1):
+        clean_name = clean_page_name(page_name)
+        file_slug = slugify(clean_name)
+        if file_slug in skip: continue
+        file_instructions.append(f"""
+{i}. docs/{file_slug}.md (id: {file_slug}, sidebar_position: {i})
+   Page Title: "{clean_name}"
+   Content Focus: {page_desc}
+   - Use project info to create relevant content
+   - Include code examples where appropriate
+   - Make it comprehensive and useful""")
+
+    first_page = clean_page_name(list(pages.keys())[0])
+    if slugify(first_page) in skip:
+        homepage_rule = "The homepage already exists - don't create a separate title page"
+    else:
+        homepage_rule = f"First file ({first_page}) is the HOMEPAGE - don't create a separate title page"
+
+    return f"""Generate Docusaurus documentation for this project:
+
+{project_info_prompt(payload)}
+
+CREATE EXACTLY {len(file_instructions)} FILES - NO MORE, NO LESS:
+{''.join(file_instructions)}
+
+CRITICAL INSTRUCTIONS:
+- Create ONLY the {len(file_instructions)} files listed above - DO NOT create any additional files
+- DO NOT create extra files like "title.md" or duplicate "introduction.md"
+- The file list above is COMPLETE and EXHAUSTIVE
+- {homepage_rule}
+{content_requirements_prompt(payload)}
+
+OUTPUT: JSON with "files" array containing EXACTLY {len(file_instructions)} file objects. No other text."""
+
+def call_ollama_bundle_stream(payload: Dict[str, Any], pages: dict, on_file=None, skip=()) -> Dict[str, Any]:
+    """Single-request mode over a streamed response.
+
+    Each file object is validated, filtered and handed to on_file(file) as soon as it
+    closes. If the stream breaks after some pages have arrived, those pages are kept
+    and the rest are left to write_fallback_pages.
+    """
+    parser = FilesStreamParser()
+    files, seen_paths = [], set()
+    try:
+        for delta in ollama_chat_stream(DOCS_SYSTEM_PROMPT, bundle_user_prompt(payload, pages, skip), timeout=OLLAMA_PAGE_TIMEOUT):
+            for f in parser.feed(delta):
+                try:
+                    validate_file_objects([f])
+                except RuntimeError as e:
+                    logger.warning(f"Skipping streamed file: {e}")
+                    continue
+                # Same rule as the non-streaming path: only the requested pages, once each
+                if not filter_expected_files([f], pages) or f["path"] in seen_paths or f["path"][5:-3] in skip:
+                    continue
+                seen_paths.add(f["path"])
+                files.append(f)
+                logger.info(f"Streamed page {len(files)}/{len(pages) - len(skip)}: {f['path']}")
+                if on_file: on_file(f)
+    except Exception as e:
+        if not files:
+            raise RuntimeError(f"Ollama stream failed before any page completed: {e}")
+        logger.error(f"Ollama stream failed after {len(files)} pages, keeping them: {e}")
+
+    if not files:
+        raise RuntimeError('Model JSON missing "files" array')
+    logger.info(f"Files to be created: {[f.get('path') for f in files]}")
+    return {"files": files, "cleaned_pages": pages}
+
+def call_ollama_bundle(payload: Dict[str, Any], pages: dict, on_file=None, skip=()) -> Dict[str, Any]:
+    """Original single-request mode: every page in one JSON response."""
+    if OLLAMA_STREAM:
+        return call_ollama_bundle_stream(payload, pages, on_file, skip)
+
+    user_prompt = bundle_user_prompt(payload, pages, skip)
+    content = ollama_chat(DOCS_SYSTEM_PROMPT, user_prompt, timeout=240)  # 4 minutes for the whole bundle
     
     # Log raw response for debugging
     logger.debug(f"Raw Ollama response: {content[:500]}...")
@@ -246,41 +521,43 @@ OUTPUT: JSON with "files" array containing EXACTLY {len(pages)} file objects. No
         raise RuntimeError('Model JSON missing "files" array')
     
     # Validate file structure
-    for i, f in enumerate(bundle["files"]):
-        if isinstance(f, str):
-            logger.error(f"File {i} is a string, not an object: {f[:100]}")
-            raise RuntimeError(f"File {i} is malformed - expected object with 'path' and 'content'")
-        if not isinstance(f, dict):
-            raise RuntimeError(f"File {i} is not a dict: {type(f)}")
-        if "path" not in f or "content" not in f:
-            raise RuntimeError(f"File {i} missing required keys. Has: {list(f.keys())}")
+    validate_file_objects(bundle["files"])
     
     # CRITICAL: Filter out any files that don't match expected page slugs
     # This prevents Ollama from hallucinating extra files
-    expected_slugs = set(slugify(clean_page_name(page_name)) for page_name in pages.keys())
-    original_count = len(bundle["files"])
-    
-    filtered_files = []
-    for f in bundle["files"]:
-        path = f.get("path", "")
-        # Extract slug from path (e.g., "docs/introduction.md" -> "introduction")
-        if path.startswith("docs/") and path.endswith(".md"):
-            file_slug = path[5:-3]  # Remove "docs/" prefix and ".md" suffix
-            if file_slug in expected_slugs:
-                filtered_files.append(f)
-            else:
-                logger.warning(f"Filtering out unexpected file: {path} (slug: {file_slug})")
-    
-    bundle["files"] = filtered_files
-    if len(filtered_files) < original_count:
-        logger.info(f"Filtered {original_count - len(filtered_files)} unexpected files. Kept {len(filtered_files)} expected files.")
+    bundle["files"] = [f for f in filter_expected_files(bundle["files"], pages) if f["path"][5:-3] not in skip]
     
     logger.info(f"Files to be created: {[f.get('path') for f in bundle['files']]}")
     
+    if on_file:
+        for f in bundle["files"]: on_file(f)
+
     # Return both the bundle and the cleaned pages dict
     bundle["cleaned_pages"] = pages
     return bundle
 
+def call_ollama(payload: Dict[str, Any], on_file=None, skip=()) -> Dict[str, Any]:
+    """Generate the docs pages; on_file(file) is called for each page as soon as it is ready.
+
+    Pages whose slug is in `skip` are left out of the request (they are already up to date).
+    """
+    # CRITICAL: Filter out junk page names before processing
+    pages = filter_valid_pages(payload.get('pages', {}))
+    skip = set(skip)
+
+    if DOCS_GENERATION_MODE == "bundle":
+        return call_ollama_bundle(payload, pages, on_file, skip)
+    return call_ollama_per_page(payload, pages, on_file, skip)
+
+# Installed once into the base image; every site's package.json lists the same set
+DOCUSAURUS_DEPENDENCIES = {
+    "@docusaurus/core": "3.5.2",
+    "@docusaurus/preset-classic": "3.5.2",
+    "prism-react-renderer": "^2.3.0",
+    "react": "^18.2.0",
+    "react-dom": "^18.2.0"
+}
+
 def write_minimal_docusaurus(site_dir: Path, site_title: str, site_base_url: str, pages: dict):
     # Minimal classic preset scaffold
     (site_dir / "docs").mkdir(parents=True, exist_ok=True)
@@ -296,13 +573,7 @@ def write_minimal_docusaurus(site_dir: Path, site_title: str, site_base_url: str
             "serve": "docusaurus serve --host 0.0.0.0 --port 3000",
             "start": "docusaurus start --host 0.0.0.0 --port 3000"
         },
-        "dependencies": {
-            "@docusaurus/core": "3.5.2",
-            "@docusaurus/preset-classic": "3.5.2",
-            "prism-react-renderer": "^2.3.0",
-            "react": "^18.2.0",
-            "react-dom": "^18.2.0"
-        }
+        "dependencies": DOCUSAURUS_DEPENDENCIES
     }, indent=2), encoding="utf-8")
 
     (site_dir / "docusaurus.config.js").write_text(f"""\
@@ -456,193 +727,20 @@ export default {{
 }};
 """, encoding="utf-8")
 
-def fix_mdx_curly_braces(content: str) -> str:
-    """
-    SANITIZE MDX content to prevent React/JSX parsing errors.
-    - Remove problematic curly braces OUTSIDE code blocks (MDX treats them as JS expressions)
-    - Replace angle brackets that look like HTML/JSX tags OUTSIDE code blocks
-    - Replace :param syntax with safe UPPERCASE
-    - Fix malformed code fences
-    - Preserves code blocks and frontmatter completely unchanged.
-    """
-    lines = content.split('\n')
-    result = []
-    in_code_block = False
-    in_frontmatter = False
-    frontmatter_count = 0
-    
-    for i, line in enumerate(lines):
-        # Track frontmatter (YAML front matter between --- markers)
-        if line.strip() == '---':
-            frontmatter_count += 1
-            if frontmatter_count <= 2:
-                in_frontmatter = True
-            if frontmatter_count == 2:
-                in_frontmatter = False
-            result.append(line)
-            continue
-        
-        # Fix malformed code fences - check for ``' or other common issues
-        stripped = line.strip()
-        
-        # CRITICAL: Fix "code```" pattern (common LLM mistake)
-        if 'code```' in stripped:
-            logger.warning(f"Line {i+1}: Found 'code```' pattern, fixing to '```'")
-            line = stripped.replace('code```', '```')
-            stripped = line.strip()
-        
-        # CRITICAL: Fix "Example:```" or any "text```" pattern
-        if re.search(r'\w```', stripped):
-            logger.warning(f"Line {i+1}: Found text immediately before ```, fixing")
-            line = re.sub(r'(\w)(```)', r'\1\n\2', line)
-            stripped = line.strip()
-        
-        if stripped.startswith('``') and not stripped.startswith('```'):
-            # Likely a malformed code fence like ``' or ``
-            logger.warning(f"Line {i+1}: Found malformed code fence '{stripped}', fixing to '```'")
-            line = line.replace(stripped, '```')
-            stripped = '```'
-        
-        # Track code blocks (```)
-        if stripped.startswith('```'):
-            in_code_block = not in_code_block
-            result.append(line)
-            continue
-        
-        # Don't modify code blocks or frontmatter - preserve them EXACTLY
-        if in_code_block or in_frontmatter:
-            result.append(line)
-            continue
+def write_doc_file(site_dir: Path, f: Dict[str, Any], first_page_slug: str):
+    """Sanitize one generated page and write it under site_dir."""
+    rel = f.get("path"); content = f.get("content","")
+    if not rel or not isinstance(rel, str): return
+    out = site_dir / rel
+    out.parent.mkdir(parents=True, exist_ok=True)
 
-        # Only modify text OUTSIDE code blocks
-        modified_line = line
-        
-        # Remove curly braces that are NOT in inline code (backticks)
-        # Strategy: protect inline code, then remove braces, then restore inline code
-        inline_code_parts = []
-        def save_inline_code(match):
-            inline_code_parts.append(match.group(0))
-            return f"__INLINE_CODE_{len(inline_code_parts)-1}__"
-        
-        # Protect inline code
-        modified_line = re.sub(r'`[^`]+`', save_inline_code, modified_line)
-        
-        # Now remove curly braces (both matched pairs AND orphaned ones)
-        modified_line = re.sub(r"\{[^}]*\}", "", modified_line)
-        modified_line = modified_line.replace('{', '').replace('}', '')
-        
-        # Restore inline code
-        for idx, code in enumerate(inline_code_parts):
-            modified_line = modified_line.replace(f"__INLINE_CODE_{idx}__", code)
-
-        # Replace :param patterns with PARAM name (drop the colon) - OUTSIDE inline code
-        inline_code_parts = []
-        modified_line = re.sub(r'`[^`]+`', save_inline_code, modified_line)
-        modified_line = re.sub(r':([a-zA-Z_][a-zA-Z0-9_]*)', r'\1', modified_line)
-        for idx, code in enumerate(inline_code_parts):
-            modified_line = modified_line.replace(f"__INLINE_CODE_{idx}__", code)
-
-        # Replace <placeholder> patterns with PLACEHOLDER (MDX thinks these are HTML tags!)
-        # But NOT in inline code or if it looks like a real HTML tag
-        inline_code_parts = []
-        modified_line = re.sub(r'`[^`]+`', save_inline_code, modified_line)
-        # Only replace simple placeholders, not complex HTML-like tags
-        modified_line = re.sub(r'<([a-zA-Z][a-zA-Z0-9_-]*)>', r'\1', modified_line)
-        for idx, code in enumerate(inline_code_parts):
-            modified_line = modified_line.replace(f"__INLINE_CODE_{idx}__", code)
-
-        result.append(modified_line)
-    
-    # Check if we ended with an unclosed code block
-    if in_code_block:
-        logger.warning("Unclosed code block detected at end of file, adding closing fence")
-        result.append('```')
-    
-    return '\n'.join(result)
+    # CRITICAL: clean frontmatter, fences, braces and placeholders for MDX in one pass;
+    # the first page gets slug: / so it serves as homepage
+    content = sanitize_page(content, homepage=(rel == f"docs/{first_page_slug}.md"))
 
-def sanitize_yaml_frontmatter(content: str) -> str:
-    """
-    Remove markdown formatting and special characters from YAML frontmatter fields.
-    This prevents YAML parsing errors from markdown syntax in frontmatter values.
-    """
-    if not content.startswith("---"):
-        return content
-    
-    lines = content.split("\n")
-    frontmatter_end = -1
-    
-    # Find end of frontmatter
-    for i in range(1, len(lines)):
-        if lines[i].strip() == "---":
-            frontmatter_end = i
-            break
-    
-    if frontmatter_end == -1:
-        return content
-    
-    # Process frontmatter lines
-    for i in range(1, frontmatter_end):
-        line = lines[i]
-        # Check if it's a key-value pair
-        if ":" in line:
-            key, value = line.split(":", 1)
-            # Strip markdown bold (**text**)
-            value = re.sub(r'\*\*([^*]+)\*\*', r'\1', value)
-            # Strip markdown italic (*text* or _text_)
-            value = re.sub(r'\*([^*]+)\*', r'\1', value)
-            value = re.sub(r'_([^_]+)_', r'\1', value)
-            # Strip markdown links [text](url)
-            value = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', value)
-            # Strip backticks
-            value = value.replace('`', '')
-            # Strip any remaining asterisks
-            value = value.replace('*', '')
-            lines[i] = f"{key}:{value}"
-    
-    return "\n".join(lines)
+    out.write_text(content, encoding="utf-8")
 
-def write_docs(site_dir: Path, files, pages: dict):
-    # Get the first page info (this will be the homepage)
-    first_page_name = list(pages.keys())[0]
-    first_page_clean = clean_page_name(first_page_name)
-    first_page_slug = slugify(first_page_clean)
-    
-    for f in files:
-        rel = f.get("path"); content = f.get("content","")
-        if not rel or not isinstance(rel, str): continue
-        out = site_dir / rel
-        out.parent.mkdir(parents=True, exist_ok=True)
-        
-        # CRITICAL: Remove markdown formatting from YAML frontmatter
-        content = sanitize_yaml_frontmatter(content)
-        
-        # CRITICAL: Escape unescaped curly braces for MDX (outside of code blocks)
-        # This prevents React/MDX errors when using {id}, {param}, etc. in text
-        content = fix_mdx_curly_braces(content)
-        
-        # CRITICAL: Add slug: / to the first page's frontmatter so it serves as homepage
-        if rel == f"docs/{first_page_slug}.md":
-            # Check if content has frontmatter
-            if content.startswith("---"):
-                lines = content.split("\n")
-                # Find the end of frontmatter
-                frontmatter_end = -1
-                for i in range(1, len(lines)):
-                    if lines[i].strip() == "---":
-                        frontmatter_end = i
-                        break
-                
-                if frontmatter_end > 0:
-                    # Check if slug already exists
-                    has_slug = any("slug:" in line for line in lines[1:frontmatter_end])
-                    if not has_slug:
-                        # Add slug: / to frontmatter
-                        lines.insert(frontmatter_end, "slug: /")
-                        content = "\n".join(lines)
-                        logger.info(f"Added 'slug: /' to {rel} frontmatter")
-        
-        out.write_text(content, encoding="utf-8")
-    
+def write_fallback_pages(site_dir: Path, pages: dict):
     # CRITICAL: Ensure ALL expected pages exist (create fallbacks for missing ones)
     for i, (page_name, page_desc) in enumerate(pages.items(), 1):
         clean_name = clean_page_name(page_name)
@@ -667,21 +765,59 @@ This page is under construction and will be updated soon.
 """, encoding="utf-8")
             logger.info(f"Created fallback page: {page_slug}.md")
 
-def write_docker(site_dir: Path):
-    (site_dir / "Dockerfile").write_text("""\
+def write_docs(site_dir: Path, files, pages: dict):
+    # Get the first page info (this will be the homepage)
+    first_page_slug = slugify(clean_page_name(list(pages.keys())[0]))
+    for f in files:
+        write_doc_file(site_dir, f, first_page_slug)
+    write_fallback_pages(site_dir, pages)
+
+_base_image_lock = threading.Lock()
+
+def dependencies_digest() -> str:
+    return hashlib.sha256(json.dumps(DOCUSAURUS_DEPENDENCIES, sort_keys=True).encode()).hexdigest()[:12]
+
+def base_image_tag() -> str:
+    """Base image tag, keyed by the dependency set so changing it triggers a rebuild."""
+    return f"{DOCS_BASE_IMAGE}:{dependencies_digest()}"
+
+def ensure_base_image() -> str:
+    """Build the shared base image (node + http-server + node_modules) once; returns its tag."""
+    tag = base_image_tag()
+    with _base_image_lock:
+        exists = subprocess.run(["docker", "image", "inspect", tag],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+        if exists:
+            return tag
+
+        logger.info(f"Building Docusaurus base image {tag} (one-time)...")
+        ctx = SITES_ROOT / ".base-image"
+        ctx.mkdir(parents=True, exist_ok=True)
+        (ctx / "package.json").write_text(json.dumps({
+            "name": "docusite-base",
+            "private": True,
+            "dependencies": DOCUSAURUS_DEPENDENCIES
+        }, indent=2), encoding="utf-8")
+        (ctx / "Dockerfile").write_text("""\
 FROM node:18-alpine
 WORKDIR /site
 
 # Install http-server globally first
 RUN npm install -g http-server
 
-# Copy package files
-COPY package.json ./
-
 # Install dependencies (no lockfile, so use npm install)
+COPY package.json ./
 RUN npm install --legacy-peer-deps
+""", encoding="utf-8")
+        subprocess.check_call(["docker", "build", "-t", tag, str(ctx)])
+        return tag
+
+def write_docker(site_dir: Path, base_image: str):
+    (site_dir / "Dockerfile").write_text(f"""\
+FROM {base_image}
+WORKDIR /site
 
-# Copy site source
+# node_modules come from the base image; only the site source is copied
 COPY . .
 
 # Build static site
@@ -690,6 +826,15 @@ RUN npx docusaurus build
 EXPOSE 3000
 # Serve the static build
 CMD ["http-server", "build", "-p", "3000", "-a", "0.0.0.0"]
+""", encoding="utf-8")
+
+    (site_dir / ".dockerignore").write_text("""\
+node_modules
+.docusaurus
+build
+Dockerfile
+docker-compose.yml
+.docsite-manifest.json
 """, encoding="utf-8")
 
     (site_dir / "docker-compose.yml").write_text("""\
@@ -711,19 +856,10 @@ networks:
 def docker_up(site_dir: Path, image: str, container: str, port: int):
     ensure_net(DOCKER_NETWORK)
     
-    # Build with --no-cache to ensure completely fresh build (no cached layers)
-    logger.info(f"Building fresh Docker image with --no-cache...")
-    # Remove any local build caches before building
-    for cache_dir in [site_dir / '.docusaurus', site_dir / 'node_modules' / '.cache']:
-        if cache_dir.exists():
-            try:
-                shutil.rmtree(cache_dir)
-                logger.info(f"Removed local cache directory: {cache_dir}")
-            except Exception as cache_err:
-                logger.warning(f"Failed to remove cache {cache_dir}: {cache_err}")
+    # Layer cache is kept: the base image layers are shared, and COPY . . invalidates on any docs change
+    logger.info(f"Building Docker image {image}...")
     subprocess.check_call([
         "docker", "build",
-        "--no-cache",
         "-t", image,
         str(site_dir)
     ])
@@ -742,6 +878,256 @@ def docker_up(site_dir: Path, image: str, container: str, port: int):
         "up", "-d", "--force-recreate"
     ], cwd=site_dir, env=env)
 
+def replace_dir(staging: Path, dest: Path):
+    """Publish a fully written staging directory at dest; readers see either the old or new tree.
+
+    dest is a symlink to a versioned sibling directory. The new version is linked in by
+    os.replace()-ing a fresh symlink over dest, which is atomic, so dest never goes missing.
+    The link is relative so it also resolves inside the containers that mount WWW_ROOT.
+    """
+    version = dest.with_name(f".{dest.name}.build-{os.getpid()}-{int(time.time() * 1000)}")
+    os.rename(staging, version)
+    previous = None
+    if dest.is_symlink():
+        previous = dest.with_name(os.readlink(dest))
+    elif dest.exists():
+        # Plain directory from before versioned builds: move it aside once (brief gap)
+        previous = dest.with_name(f".{dest.name}.build-legacy-{os.getpid()}")
+        os.rename(dest, previous)
+
+    link = dest.with_name(f".{dest.name}.link-{os.getpid()}-{threading.get_ident()}")
+    link.unlink(missing_ok=True)
+    link.symlink_to(version.name, target_is_directory=True)
+    os.replace(link, dest)
+    if previous is not None and previous != version:
+        shutil.rmtree(previous, ignore_errors=True)
+
+def extract_static_build(image: str, slug: str) -> Path:
+    """Copy /site/build out of a built site image into WWW_ROOT/<slug>."""
+    WWW_ROOT.mkdir(parents=True, exist_ok=True)
+    staging = WWW_ROOT / f".{slug}.staging-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    tmp_container = f"docusite_extract_{slug}_{os.getpid()}"
+    subprocess.check_call(["docker", "create", "--name", tmp_container, image], stdout=subprocess.DEVNULL)
+    try:
+        subprocess.check_call(["docker", "cp", f"{tmp_container}:/site/build", str(staging)])
+    finally:
+        subprocess.run(["docker", "rm", "-f", tmp_container], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    dest = WWW_ROOT / slug
+    replace_dir(staging, dest)
+    return dest
+
+_shared_server_lock = threading.Lock()
+
+def shared_server_conf() -> str:
+    # doc-<slug>.<anything> -> /srv/<slug>; new sites are served without a reload
+    return r"""server {
+    listen 80 default_server;
+    server_name ~^doc-(?<slug>[a-z0-9-]+)\.;
+
+    if ($slug = "") { return 404; }
+    root /srv/$slug;
+    index index.html;
+
+    location / {
+        try_files $uri $uri/ $uri.html =404;
+    }
+    error_page 404 /404.html;
+
+    location /assets/ {
+        expires 30d;
+        add_header Cache-Control "public, immutable";
+    }
+}
+"""
+
+def ensure_shared_server() -> int:
+    """Start the single nginx container that serves every site in shared mode; returns its port."""
+    with _shared_server_lock:
+        conf_dir = SITES_ROOT / ".shared-server"
+        conf_dir.mkdir(parents=True, exist_ok=True)
+        WWW_ROOT.mkdir(parents=True, exist_ok=True)
+        (conf_dir / "default.conf").write_text(shared_server_conf(), encoding="utf-8")
+
+        res = subprocess.run(["docker", "inspect", "-f", "{{.State.Running}}", SHARED_SERVER_CONTAINER],
+                             capture_output=True, text=True)
+        if res.returncode == 0 and res.stdout.strip() == "true":
+            return SHARED_SERVER_PORT
+
+        ensure_net(DOCKER_NETWORK)
+        logger.info(f"Starting shared docs server {SHARED_SERVER_CONTAINER} on port {SHARED_SERVER_PORT}...")
+        subprocess.run(["docker", "rm", "-f", SHARED_SERVER_CONTAINER], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        subprocess.check_call([
+            "docker", "run", "-d",
+            "--name", SHARED_SERVER_CONTAINER,
+            "--restart", "unless-stopped",
+            "--network", DOCKER_NETWORK,
+            "-p", f"{SHARED_SERVER_PORT}:80",
+            "-v", f"{WWW_ROOT}:/srv:ro",
+            "-v", f"{conf_dir / 'default.conf'}:/etc/nginx/conf.d/default.conf:ro",
+            SHARED_SERVER_IMAGE
+        ], stdout=subprocess.DEVNULL)
+        return SHARED_SERVER_PORT
+
+_workspace_lock = threading.Lock()
+
+def ensure_workspace() -> Path:
+    """Install the Docusaurus dependency set once into DOCS_WORKSPACE; returns its node_modules."""
+    node_modules = DOCS_WORKSPACE / "node_modules"
+    marker = DOCS_WORKSPACE / ".deps-digest"
+    with _workspace_lock:
+        if marker.exists() and marker.read_text().strip() == dependencies_digest() and node_modules.is_dir():
+            return node_modules
+
+        if not shutil.which("npm"):
+            raise RuntimeError("BUILD_MODE=host needs node/npm on PATH")
+        logger.info(f"Installing Docusaurus workspace in {DOCS_WORKSPACE} (one-time)...")
+        DOCS_WORKSPACE.mkdir(parents=True, exist_ok=True)
+        (DOCS_WORKSPACE / "package.json").write_text(json.dumps({
+            "name": "docusite-workspace",
+            "private": True,
+            "dependencies": DOCUSAURUS_DEPENDENCIES
+        }, indent=2), encoding="utf-8")
+        subprocess.check_call(["npm", "install", "--legacy-peer-deps"], cwd=DOCS_WORKSPACE)
+        marker.write_text(dependencies_digest(), encoding="utf-8")
+        return node_modules
+
+def host_build(site_dir: Path, slug: str) -> Path:
+    """docusaurus build for one site against the warm workspace, swapped into WWW_ROOT/<slug>."""
+    node_modules = ensure_workspace()
+    link = site_dir / "node_modules"
+    if not link.exists():
+        link.symlink_to(node_modules, target_is_directory=True)
+
+    WWW_ROOT.mkdir(parents=True, exist_ok=True)
+    staging = WWW_ROOT / f".{slug}.staging-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    start = time.time()
+    try:
+        subprocess.check_call([str(node_modules / ".bin" / "docusaurus"), "build", "--out-dir", str(staging)], cwd=site_dir)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    dest = WWW_ROOT / slug
+    replace_dir(staging, dest)
+    logger.info(f"Built {slug} on the host in {time.time() - start:.1f}s")
+    return dest
+
+def running_container_port(container: str):
+    """Host port published for the container's port 3000, or None if it is not running."""
+    res = subprocess.run(["docker", "port", container, "3000"], capture_output=True, text=True)
+    if res.returncode != 0 or not res.stdout.strip():
+        return None
+    return int(res.stdout.split()[0].rsplit(":", 1)[1])
+
+def serve_site_container(slug: str, container: str) -> int:
+    """Per-site http-server over WWW_ROOT/<slug>, started from the base image without a per-site build.
+
+    A running container started this way is left alone: it serves whatever build was last
+    swapped in. One left over from a docker-mode build is replaced.
+    """
+    port = running_container_port(container)
+    labels = subprocess.run(["docker", "inspect", "-f", '{{index .Config.Labels "docusite.build"}}', container],
+                            capture_output=True, text=True).stdout.strip()
+    if port is not None and labels == "host":
+        return port
+
+    ensure_net(DOCKER_NETWORK)
+    # A docker-mode container still holds the slug's port until it is removed below
+    port = ports.assign(slug, own_port=port)
+    subprocess.run(["docker", "rm", "-f", container], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subprocess.check_call([
+        "docker", "run", "-d",
+        "--name", container,
+        "--label", "docusite.build=host",
+        "--restart", "unless-stopped",
+        "--network", DOCKER_NETWORK,
+        "-p", f"{port}:3000",
+        "-v", f"{WWW_ROOT}:/www:ro",
+        ensure_base_image(),
+        "http-server", f"/www/{slug}", "-p", "3000", "-a", "0.0.0.0"
+    ], stdout=subprocess.DEVNULL)
+    return port
+
+MANIFEST_NAME = ".docsite-manifest.json"
+
+def page_input_hash(payload: Dict[str, Any], page_name: str, page_desc: str, position: int) -> str:
+    """Hash of everything that goes into one page's prompt (plus model and system prompt)."""
+    material = json.dumps({
+        "model": OLLAMA_MODEL,
+        "system": PAGE_SYSTEM_PROMPT if DOCS_GENERATION_MODE != "bundle" else DOCS_SYSTEM_PROMPT,
+        "name": payload.get("name"),
+        "description": payload.get("description"),
+        "goal": payload.get("goal"),
+        "dependencies": payload.get("dependencies", []),
+        "installation": payload.get("installation", []),
+        "page": clean_page_name(page_name),
+        "page_desc": page_desc,
+        "position": position,
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def site_input_hash(payload: Dict[str, Any], fqdn: str, page_hashes: Dict[str, str]) -> str:
+    """Hash of the inputs to a build: scaffold settings plus every page's input hash."""
+    material = json.dumps({
+        "title": payload.get("name"),
+        "fqdn": fqdn,
+        "deps": dependencies_digest(),
+        "pages": list(page_hashes.items()),
+    })
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def load_manifest(site_dir: Path) -> Dict[str, Any]:
+    path = site_dir / MANIFEST_NAME
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        if isinstance(manifest.get("pages"), dict):
+            return manifest
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+    return {"pages": {}, "built": None}
+
+def save_manifest(site_dir: Path, manifest: Dict[str, Any]):
+    path = site_dir / MANIFEST_NAME
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+def plan_pages(payload: Dict[str, Any], pages: dict, site_dir: Path, manifest: Dict[str, Any]):
+    """Returns ({slug: input hash}, slugs that can be reused as-is).
+
+    Removes the docs of dropped pages, and the old docs of pages about to be regenerated so
+    that one which then fails gets a fallback page instead of being served stale.
+    """
+    page_hashes = {}
+    for i, (page_name, page_desc) in enumerate(pages.items(), 1):
+        page_hashes[slugify(clean_page_name(page_name))] = page_input_hash(payload, page_name, page_desc, i)
+
+    reuse = set()
+    for page_slug, h in page_hashes.items():
+        entry = manifest["pages"].get(page_slug)
+        # Fallback pages are never recorded, so they are retried on the next publish
+        if entry and entry.get("hash") == h and (site_dir / "docs" / f"{page_slug}.md").exists():
+            reuse.add(page_slug)
+
+    docs_dir = site_dir / "docs"
+    if docs_dir.exists():
+        for doc in docs_dir.glob("*.md"):
+            if doc.stem not in page_hashes:
+                logger.info(f"Removing page no longer in payload: {doc.name}")
+                doc.unlink()
+            elif doc.stem not in reuse:
+                logger.info(f"Removing outdated page before regenerating it: {doc.name}")
+                doc.unlink()
+    return page_hashes, reuse
+
+def site_is_served(slug: str, container: str) -> bool:
+    if BUILD_MODE == "host" or HOSTING_MODE == "shared":
+        return (WWW_ROOT / slug).is_dir()
+    return running_container_port(container) is not None
+
 def enhance_project_description(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
     Enhance bland or empty project descriptions using available context.
@@ -787,8 +1173,128 @@ def enhance_project_description(payload: Dict[str, Any]) -> Dict[str, Any]:
     
     return payload
 
+def publish_site(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Generate, build and serve one site from a validated payload; returns the /generate-docs response."""
+    slug = slugify(payload["repo-name"])
+    fqdn = f"doc-{slug}.{BASE_DOMAIN}"
+    logger.info(f"Generated slug: {slug}, FQDN: {fqdn}")
+
+    # Existing sites are updated in place: only pages whose inputs changed are regenerated
+    site_dir = SITES_ROOT / slug
+    image = f"docusite:{slug}"
+    container = f"docusite_{slug}"
+    site_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(site_dir)
+
+    cleaned_pages = filter_valid_pages(payload["pages"])
+    first_page_slug = slugify(clean_page_name(list(cleaned_pages.keys())[0]))
+    page_hashes, reuse = plan_pages(payload, cleaned_pages, site_dir, manifest)
+    logger.info(f"Site directory: {site_dir} ({len(reuse)}/{len(page_hashes)} pages unchanged)")
+
+    # 1) Get files from Ollama, writing each page to disk as soon as it is ready
+    generated = set()
+    def on_file(f):
+        write_doc_file(site_dir, f, first_page_slug)
+        generated.add(f["path"][5:-3])
+
+    if len(reuse) < len(page_hashes):
+        logger.info("Step 1: Calling Ollama to generate docs...")
+        bundle = call_ollama(payload, on_file=on_file, skip=reuse)
+        logger.info(f"Ollama returned {len(bundle.get('files', []))} files")
+    else:
+        logger.info("Step 1: All pages unchanged, skipping Ollama")
+
+    manifest["pages"] = {
+        page_slug: {"hash": h, "path": f"docs/{page_slug}.md"}
+        for page_slug, h in page_hashes.items() if page_slug in reuse or page_slug in generated
+    }
+    save_manifest(site_dir, manifest)
+
+    # 2) Minimal docusaurus scaffold
+    logger.info("Step 2: Writing Docusaurus scaffold...")
+    write_minimal_docusaurus(site_dir, site_title=payload["name"], site_base_url=fqdn, pages=cleaned_pages)
+
+    # 3) Fill in any pages the model did not deliver
+    logger.info("Step 3: Writing fallback pages for missing docs...")
+    write_fallback_pages(site_dir, cleaned_pages)
+
+    # 4) Build and serve (skipped when neither pages nor scaffold changed since the last build)
+    site_hash = site_input_hash(payload, fqdn, page_hashes)
+    skip_build = manifest.get("built") == site_hash and len(generated) == 0 and site_is_served(slug, container)
+    if skip_build:
+        logger.info("Step 4: Site unchanged since last build, reusing it")
+        if HOSTING_MODE == "shared":
+            port = ensure_shared_server()
+        elif BUILD_MODE == "host":
+            port = serve_site_container(slug, container)
+        else:
+            port = running_container_port(container)
+    elif BUILD_MODE == "host":
+        logger.info("Step 4: Building site on the host...")
+        www_dir = host_build(site_dir, slug)
+        if HOSTING_MODE == "shared":
+            port = ensure_shared_server()
+        else:
+            port = serve_site_container(slug, container)
+        logger.info(f"Published {www_dir} on port {port}")
+    elif HOSTING_MODE == "shared":
+        logger.info("Step 4: Creating Docker files and building...")
+        write_docker(site_dir, ensure_base_image())
+        # Build once, copy the static output next to every other site, serve it from the shared nginx
+        subprocess.check_call(["docker", "build", "-t", image, str(site_dir)])
+        www_dir = extract_static_build(image, slug)
+        port = ensure_shared_server()
+        logger.info(f"Published {www_dir} on shared server port {port}")
+    else:
+        logger.info("Step 4: Creating Docker files and building...")
+        write_docker(site_dir, ensure_base_image())
+        # deterministic per slug; the running container keeps its port across republishes
+        port = ports.assign(slug, own_port=running_container_port(container))
+        logger.info(f"Assigned port: {port}")
+        logger.info(f"Building and starting container: {container}")
+        docker_up(site_dir, image, container, port)
+        logger.info(f"Container started successfully on port {port}")
+
+    if not skip_build and len(manifest["pages"]) == len(page_hashes):
+        # Only record a build made entirely of real pages, so fallbacks get retried
+        manifest["built"] = site_hash
+        save_manifest(site_dir, manifest)
+
+    # 5) Auto-configure NPM if enabled
+    npm_result = None
+    if NPM_ENABLED:
+        logger.info("Step 5: Configuring NPM proxy...")
+        try:
+            npm_result = npm.upsert_proxy(fqdn, DOCS_SERVER_IP, port)
+            logger.info(f"NPM proxy created: {npm_result}")
+        except Exception as npm_err:
+            # Don't fail the whole request if NPM fails
+            logger.error(f"NPM configuration failed: {npm_err}")
+            npm_result = {"error": str(npm_err)}
+
+    # The shared server routes by Host, so a bare IP:port cannot select the site
+    direct_url = f"http://{fqdn}:{port}" if HOSTING_MODE == "shared" else f"http://{DOCS_SERVER_IP}:{port}"
+    response = {
+        "status":"ok",
+        "slug": slug,
+        "dir": str(site_dir),
+        "port": port,
+        "proxy_target": f"http://{DOCS_SERVER_IP}:{port}",
+        "suggested_domain": fqdn,
+        "url": f"https://{fqdn}" if NPM_ENABLED else direct_url
+    }
+    
+    if npm_result:
+        response["npm"] = npm_result
+
+    logger.info(f"SUCCESS! Site available at: {response['url']}")
+    return response
+
+builds = BuildQueue(publish_site, max_workers=BUILD_WORKERS, max_pending=BUILD_QUEUE_SIZE)
+
 @app.route("/generate-docs", methods=["POST"])
 def generate_docs():
+    """Queue a publish. Waits for it by default (same response as before); ?wait=false returns 202 with a job id."""
     try:
         logger.info("=== NEW REQUEST: /generate-docs ===")
         payload = request.get_json(force=True)
@@ -800,94 +1306,36 @@ def generate_docs():
         payload = enhance_project_description(payload)
         slug = slugify(payload["repo-name"])
         if not slug: raise ValueError("Invalid repo-name")
-        fqdn = f"doc-{slug}.{BASE_DOMAIN}"
-        logger.info(f"Generated slug: {slug}, FQDN: {fqdn}")
-
-        # CRITICAL: If site exists, completely nuke it and its container first
-        site_dir = SITES_ROOT / slug
-        image = f"docusite:{slug}"
-        container = f"docusite_{slug}"
-        
-        if site_dir.exists():
-            logger.info(f"Existing site detected! Performing NUCLEAR cleanup...")
-            # Stop and remove container
-            logger.info(f"Stopping and removing container: {container}")
-            subprocess.run(["docker", "stop", container], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            subprocess.run(["docker", "rm", "-f", container], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            # Remove image to force rebuild
-            logger.info(f"Removing Docker image: {image}")
-            subprocess.run(["docker", "rmi", "-f", image], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            # Prune build cache to remove all cached layers
-            logger.info("Pruning Docker build cache...")
-            subprocess.run(["docker", "builder", "prune", "-f"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            # Remove site directory
-            logger.info(f"Removing site directory: {site_dir}")
-            shutil.rmtree(site_dir)
-            logger.info("Nuclear cleanup complete!")
-        
-        site_dir.mkdir(parents=True, exist_ok=True)
-        logger.info(f"Created fresh site directory: {site_dir}")
-
-        # 1) Get files from Ollama
-        logger.info("Step 1: Calling Ollama to generate docs...")
-        bundle = call_ollama(payload)
-        logger.info(f"Ollama returned {len(bundle.get('files', []))} files")
-        
-        # Use cleaned pages from validation
-        cleaned_pages = bundle.pop("cleaned_pages", payload["pages"])
-
-        # 2) Minimal docusaurus scaffold
-        logger.info("Step 2: Writing Docusaurus scaffold...")
-        write_minimal_docusaurus(site_dir, site_title=payload["name"], site_base_url=fqdn, pages=cleaned_pages)
-
-        # 3) Write docs
-        logger.info("Step 3: Writing generated docs...")
-        write_docs(site_dir, bundle["files"], cleaned_pages)
-
-        # 4) Dockerize and run
-        logger.info("Step 4: Creating Docker files and building...")
-        write_docker(site_dir)
-        port = ports.assign(slug)        # deterministic per slug
-        logger.info(f"Assigned port: {port}")
-        image = f"docusite:{slug}"
-        container = f"docusite_{slug}"
-        logger.info(f"Building and starting container: {container}")
-        docker_up(site_dir, image, container, port)
-        logger.info(f"Container started successfully on port {port}")
-
-        # 5) Auto-configure NPM if enabled
-        npm_result = None
-        if NPM_ENABLED:
-            logger.info("Step 5: Configuring NPM proxy...")
-            try:
-                token = npm_login()
-                npm_result = npm_create_proxy(token, fqdn, DOCS_SERVER_IP, port)
-                logger.info(f"NPM proxy created: {npm_result}")
-            except Exception as npm_err:
-                # Don't fail the whole request if NPM fails
-                logger.error(f"NPM configuration failed: {npm_err}")
-                npm_result = {"error": str(npm_err)}
-
-        response = {
-            "status":"ok",
-            "slug": slug,
-            "dir": str(site_dir),
-            "port": port,
-            "proxy_target": f"http://{DOCS_SERVER_IP}:{port}",
-            "suggested_domain": fqdn,
-            "url": f"https://{fqdn}" if NPM_ENABLED else f"http://{DOCS_SERVER_IP}:{port}"
-        }
-        
-        if npm_result:
-            response["npm"] = npm_result
-
-        logger.info(f"SUCCESS! Site available at: {response['url']}")
-        return jsonify(response), 200
-
+        filter_valid_pages(payload["pages"])
     except Exception as e:
         logger.error(f"ERROR: {str(e)}", exc_info=True)
         return jsonify({"status":"error","error":str(e)}), 400
 
+    try:
+        job = builds.submit(slug, payload)
+    except QueueFull as e:
+        return jsonify({"status":"error","error":str(e)}), 503
+
+    accepted = {"status": job.status, "job_id": job.id, "slug": slug, "status_url": f"/builds/{job.id}"}
+    if request.args.get("wait", "true").lower() == "false":
+        return jsonify(accepted), 202
+    if not job.wait(BUILD_WAIT_TIMEOUT):
+        return jsonify(accepted), 202
+    if job.status == "failed":
+        return jsonify({"status":"error","error":job.error,"job_id":job.id}), 400
+    return jsonify(job.result), 200
+
+@app.route("/builds/<job_id>", methods=["GET"])
+def get_build(job_id):
+    job = builds.get(job_id)
+    if job is None:
+        return jsonify({"status":"error","error":"Unknown job"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route("/builds", methods=["GET"])
+def list_builds():
+    return jsonify(builds.stats()), 200
+
 def get_host_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
@@ -898,107 +1346,5 @@ def get_host_ip():
     finally:
         s.close()
 
-def npm_login() -> str:
-    """Login to NPM and get auth token"""
-    r = requests.post(f"{NPM_HOST}/api/tokens", json={
-        "identity": NPM_EMAIL,
-        "secret": NPM_PASSWORD
-    }, timeout=10)
-    r.raise_for_status()
-    return r.json()["token"]
-
-def npm_create_proxy(token: str, domain: str, forward_ip: str, forward_port: int):
-    """Create or update NPM proxy host with SSL"""
-    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    
-    # Check if proxy already exists
-    r = requests.get(f"{NPM_HOST}/api/nginx/proxy-hosts", headers=headers, timeout=10)
-    r.raise_for_status()
-    existing = [p for p in r.json() if domain in p.get("domain_names", [])]
-    
-    # Get SSL certificate (should be CloudFlare Siru.Dev wildcard)
-    cert_id = 0
-    try:
-        certs_r = requests.get(f"{NPM_HOST}/api/nginx/certificates", headers=headers, timeout=10)
-        certs_r.raise_for_status()
-        # Look for CloudFlare cert or wildcard cert
-        for cert in certs_r.json():
-            cert_name = cert.get("nice_name", "").lower()
-            cert_domains = cert.get("domain_names", [])
-            # Match CloudFlare cert or wildcard
-            if "cloudflare" in cert_name or "siru.dev" in cert_name or "*.siru.dev" in cert_domains:
-                cert_id = cert["id"]
-                logger.info(f"Using SSL cert: {cert.get('nice_name', 'Unknown')} (ID: {cert_id})")
-                break
-        
-        if cert_id == 0:
-            logger.warning("No SSL certificate found! Proxy will use HTTP only.")
-    except Exception as e:
-        logger.error(f"Could not fetch certificates: {e}")
-    
-    if existing:
-        # Update existing - only send the exact fields NPM expects
-        host_id = existing[0]["id"]
-        existing_data = existing[0]
-        
-        # Build minimal update payload with only allowed fields
-        payload = {
-            "domain_names": existing_data.get("domain_names", [domain]),
-            "forward_scheme": existing_data.get("forward_scheme", "http"),
-            "forward_host": forward_ip,
-            "forward_port": forward_port,
-            "access_list_id": existing_data.get("access_list_id", 0),
-            "certificate_id": cert_id,
-            "ssl_forced": True if cert_id > 0 else False,
-            "caching_enabled": existing_data.get("caching_enabled", False),
-            "block_exploits": existing_data.get("block_exploits", True),
-            "advanced_config": existing_data.get("advanced_config", ""),
-            "meta": existing_data.get("meta", {}),
-            "allow_websocket_upgrade": existing_data.get("allow_websocket_upgrade", True),
-            "http2_support": existing_data.get("http2_support", True),
-            "hsts_enabled": existing_data.get("hsts_enabled", False),
-            "hsts_subdomains": existing_data.get("hsts_subdomains", False)
-        }
-        
-        logger.info(f"Updating existing proxy host ID {host_id}: {forward_ip}:{forward_port}")
-        r = requests.put(f"{NPM_HOST}/api/nginx/proxy-hosts/{host_id}", 
-                        headers=headers, json=payload, timeout=10)
-        try:
-            r.raise_for_status()
-        except requests.HTTPError as e:
-            logger.error(f"NPM update failed with status {r.status_code}")
-            logger.error(f"Response: {r.text}")
-            raise
-    else:
-        # Create new
-        payload = {
-            "domain_names": [domain],
-            "forward_scheme": "http",
-            "forward_host": forward_ip,
-            "forward_port": forward_port,
-            "access_list_id": 0,
-            "certificate_id": cert_id,
-            "ssl_forced": True if cert_id > 0 else False,
-            "caching_enabled": False,
-            "block_exploits": True,
-            "advanced_config": "",
-            "allow_websocket_upgrade": True,
-            "http2_support": True,
-            "hsts_enabled": False,
-            "hsts_subdomains": False
-        }
-        
-        logger.info(f"Creating new proxy host for {domain}")
-        r = requests.post(f"{NPM_HOST}/api/nginx/proxy-hosts", 
-                         headers=headers, json=payload, timeout=10)
-        try:
-            r.raise_for_status()
-        except requests.HTTPError as e:
-            logger.error(f"NPM create failed with status {r.status_code}")
-            logger.error(f"Response: {r.text}")
-            raise
-    
-    return r.json()
-
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.getenv("PORT","8080")))
@@ -0,0 +1,126 @@
+# build_queue.py
+import uuid, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    """Raised when too many distinct slugs are already waiting for a build."""
+
+class BuildJob:
+    """One publish of one slug. Duplicate requests that arrive while it is still queued share it."""
+
+    def __init__(self, slug: str, payload: dict):
+        self.id = str(uuid.uuid4())[:8]
+        self.slug = slug
+        self.payload = payload
+        self.status = "queued"
+        self.requests = 1
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "slug": self.slug,
+            "status": self.status,
+            "requests": self.requests,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class BuildQueue:
+    """Bounded worker pool for site builds with per-slug serialization and coalescing.
+
+    At most `max_workers` builds run at once and never two for the same slug. A request
+    for a slug that is already waiting replaces the waiting job's payload (last write wins)
+    and gets the same job back; a request for a slug that is building queues one follow-up
+    build that starts when the current one finishes.
+    """
+
+    def __init__(self, run, max_workers: int = 2, max_pending: int = 32, max_history: int = 500):
+        self.run = run
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="build")
+        self._lock = threading.Lock()
+        self._pending = {}   # slug -> queued BuildJob
+        self._running = {}   # slug -> running BuildJob
+        self._jobs = {}      # job_id -> BuildJob, insertion ordered
+
+    def submit(self, slug: str, payload: dict) -> BuildJob:
+        with self._lock:
+            job = self._pending.get(slug)
+            if job is not None:
+                job.payload = payload
+                job.requests += 1
+                logger.info(f"[{job.id}] Coalesced request for {slug} ({job.requests} requests)")
+                return job
+
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull(f"Build queue is full ({len(self._pending)} slugs waiting)")
+
+            job = BuildJob(slug, payload)
+            self._pending[slug] = job
+            self._jobs[job.id] = job
+            self._prune()
+            if slug not in self._running:
+                self._executor.submit(self._run, slug)
+        logger.info(f"[{job.id}] Queued build for {slug}")
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "running": sorted(self._running),
+                "pending": sorted(self._pending),
+            }
+
+    def _run(self, slug: str):
+        with self._lock:
+            job = self._pending.pop(slug)
+            self._running[slug] = job
+            job.status = "running"
+            job.started_at = datetime.utcnow().isoformat()
+        try:
+            job.result = self.run(job.payload)
+            job.status = "succeeded"
+        except Exception as e:
+            logger.error(f"[{job.id}] Build for {slug} failed: {e}", exc_info=True)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.utcnow().isoformat()
+            with self._lock:
+                del self._running[slug]
+                # A request arrived while this build ran: start its follow-up now
+                if slug in self._pending:
+                    self._executor.submit(self._run, slug)
+            job._done.set()
+
+    def _prune(self):
+        # Only finished jobs are evicted; queued/running ones are always kept
+        excess = len(self._jobs) - self.max_history
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].status in ("succeeded", "failed"):
+                del self._jobs[job_id]
+                excess -= 1
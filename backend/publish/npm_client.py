@@ -0,0 +1,205 @@
+# npm_client.py
+import time, logging, threading
+from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+class NPMClient:
+    """Nginx Proxy Manager API client that keeps its state between publishes.
+
+    One pooled requests.Session, the auth token reused until shortly before it expires
+    (refreshed early on a 401), and local indexes of proxy hosts (domain -> host) and the
+    SSL certificate. The indexes are loaded on first use, refreshed after `index_ttl`
+    seconds or when the server disagrees with them, and updated from every create/update
+    response. Re-publishing a known domain costs one PUT, or nothing when it already points
+    at the right target.
+    """
+
+    def __init__(self, host: str, email: str, password: str, index_ttl: float = 3600, timeout: float = 10):
+        self.host = host.rstrip("/")
+        self.email = email
+        self.password = password
+        self.index_ttl = index_ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.RLock()
+        self._token = None
+        self._token_expires = 0.0
+        self._hosts = None          # domain -> proxy host record
+        self._hosts_loaded = 0.0
+        self._cert_id = None
+        self._cert_loaded = 0.0
+
+    # ---- auth ----
+    def _login(self):
+        r = self.session.post(f"{self.host}/api/tokens", json={
+            "identity": self.email,
+            "secret": self.password
+        }, timeout=self.timeout)
+        r.raise_for_status()
+        data = r.json()
+        self._token = data["token"]
+        self._token_expires = self._parse_expiry(data.get("expires"))
+        logger.info("Logged in to NPM")
+
+    @staticmethod
+    def _parse_expiry(value) -> float:
+        try:
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+        except (TypeError, ValueError):
+            return time.time() + 3600  # NPM default token lifetime is longer; be conservative
+
+    def _request(self, method: str, path: str, **kwargs):
+        with self._lock:
+            if self._token is None or time.time() > self._token_expires - 60:
+                self._login()
+            token = self._token
+        r = self.session.request(method, f"{self.host}{path}", timeout=self.timeout,
+                                 headers={"Authorization": f"Bearer {token}"}, **kwargs)
+        if r.status_code == 401:
+            with self._lock:
+                self._login()
+                token = self._token
+            r = self.session.request(method, f"{self.host}{path}", timeout=self.timeout,
+                                     headers={"Authorization": f"Bearer {token}"}, **kwargs)
+        return r
+
+    # ---- indexes ----
+    def refresh_hosts(self):
+        r = self._request("GET", "/api/nginx/proxy-hosts")
+        r.raise_for_status()
+        hosts = {}
+        for host in r.json():
+            for domain in host.get("domain_names", []):
+                hosts[domain] = host
+        with self._lock:
+            self._hosts = hosts
+            self._hosts_loaded = time.time()
+
+    def _host_for(self, domain: str):
+        with self._lock:
+            stale = self._hosts is None or time.time() - self._hosts_loaded > self.index_ttl
+        if stale:
+            self.refresh_hosts()
+        with self._lock:
+            return self._hosts.get(domain)
+
+    def _remember(self, host: dict):
+        with self._lock:
+            if self._hosts is None:
+                return
+            for domain in host.get("domain_names", []):
+                self._hosts[domain] = host
+
+    def certificate_id(self) -> int:
+        """ID of the CloudFlare / wildcard certificate, or 0 if there is none."""
+        with self._lock:
+            if self._cert_id is not None and time.time() - self._cert_loaded <= self.index_ttl:
+                return self._cert_id
+        cert_id = 0
+        try:
+            r = self._request("GET", "/api/nginx/certificates")
+            r.raise_for_status()
+            # Look for CloudFlare cert or wildcard cert
+            for cert in r.json():
+                cert_name = cert.get("nice_name", "").lower()
+                cert_domains = cert.get("domain_names", [])
+                # Match CloudFlare cert or wildcard
+                if "cloudflare" in cert_name or "siru.dev" in cert_name or "*.siru.dev" in cert_domains:
+                    cert_id = cert["id"]
+                    logger.info(f"Using SSL cert: {cert.get('nice_name', 'Unknown')} (ID: {cert_id})")
+                    break
+            if cert_id == 0:
+                logger.warning("No SSL certificate found! Proxy will use HTTP only.")
+        except Exception as e:
+            # Not cached, so the next publish tries again
+            logger.error(f"Could not fetch certificates: {e}")
+            return 0
+        with self._lock:
+            self._cert_id = cert_id
+            self._cert_loaded = time.time()
+        return cert_id
+
+    # ---- proxy hosts ----
+    def upsert_proxy(self, domain: str, forward_ip: str, forward_port: int) -> dict:
+        """Create or update the proxy host for `domain` with SSL."""
+        cert_id = self.certificate_id()
+        existing = self._host_for(domain)
+
+        if existing and existing.get("forward_host") == forward_ip and existing.get("forward_port") == forward_port \
+                and existing.get("certificate_id") == cert_id:
+            logger.info(f"Proxy host {existing['id']} for {domain} already up to date")
+            return existing
+
+        if existing:
+            r = self._update(existing, domain, forward_ip, forward_port, cert_id)
+            if r.status_code == 404:
+                # Deleted behind our back: drop the stale entry and create it instead
+                logger.warning(f"Proxy host {existing['id']} for {domain} no longer exists, recreating")
+                self.refresh_hosts()
+                r = self._create(domain, forward_ip, forward_port, cert_id)
+        else:
+            r = self._create(domain, forward_ip, forward_port, cert_id)
+            if r.status_code == 400 and "already in use" in r.text.lower():
+                # Created by someone else since the index was loaded
+                self.refresh_hosts()
+                existing = self._host_for(domain)
+                if existing:
+                    r = self._update(existing, domain, forward_ip, forward_port, cert_id)
+
+        try:
+            r.raise_for_status()
+        except requests.HTTPError:
+            logger.error(f"NPM request failed with status {r.status_code}")
+            logger.error(f"Response: {r.text}")
+            raise
+        host = r.json()
+        self._remember(host)
+        return host
+
+    def _update(self, existing: dict, domain: str, forward_ip: str, forward_port: int, cert_id: int):
+        # Build minimal update payload with only allowed fields
+        payload = {
+            "domain_names": existing.get("domain_names", [domain]),
+            "forward_scheme": existing.get("forward_scheme", "http"),
+            "forward_host": forward_ip,
+            "forward_port": forward_port,
+            "access_list_id": existing.get("access_list_id", 0),
+            "certificate_id": cert_id,
+            "ssl_forced": True if cert_id > 0 else False,
+            "caching_enabled": existing.get("caching_enabled", False),
+            "block_exploits": existing.get("block_exploits", True),
+            "advanced_config": existing.get("advanced_config", ""),
+            "meta": existing.get("meta", {}),
+            "allow_websocket_upgrade": existing.get("allow_websocket_upgrade", True),
+            "http2_support": existing.get("http2_support", True),
+            "hsts_enabled": existing.get("hsts_enabled", False),
+            "hsts_subdomains": existing.get("hsts_subdomains", False)
+        }
+        logger.info(f"Updating existing proxy host ID {existing['id']}: {forward_ip}:{forward_port}")
+        return self._request("PUT", f"/api/nginx/proxy-hosts/{existing['id']}", json=payload)
+
+    def _create(self, domain: str, forward_ip: str, forward_port: int, cert_id: int):
+        payload = {
+            "domain_names": [domain],
+            "forward_scheme": "http",
+            "forward_host": forward_ip,
+            "forward_port": forward_port,
+            "access_list_id": 0,
+            "certificate_id": cert_id,
+            "ssl_forced": True if cert_id > 0 else False,
+            "caching_enabled": False,
+            "block_exploits": True,
+            "advanced_config": "",
+            "allow_websocket_upgrade": True,
+            "http2_support": True,
+            "hsts_enabled": False,
+            "hsts_subdomains": False
+        }
+        logger.info(f"Creating new proxy host for {domain}")
+        return self._request("POST", "/api/nginx/proxy-hosts", json=payload)
@@ -1,24 +1,83 @@
 # portmap.py
-import json, os, random, socket
+import json, os, random, socket, fcntl, threading
+from contextlib import contextmanager
 from pathlib import Path
 
 class PortMap:
+    """slug -> port assignments in [base, base + limit), persisted to a JSON file.
+
+    Keeps an inverted port -> slug index and a free list (with an index for O(1) removal),
+    so assignment never scans the map. Every change happens under a thread lock plus an
+    flock on `<path>.lock`, after reloading the file if another process changed it, and is
+    written with write-to-temp + rename so readers never see a torn file.
+    """
+
     def __init__(self, path: Path, base: int = 18080, limit: int = 2000):
         self.path = Path(path)
         self.base = base
         self.limit = limit
-        self._load()
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._lock = threading.Lock()
+        self._stamp = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._locked():
+            if not self.path.exists():
+                self._save()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        # Reload only when the file changed since we last read or wrote it
+        try:
+            st = self.path.stat()
+            stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            stamp = None
+        if stamp != self._stamp or not hasattr(self, "data"):
+            self._load()
+            self._stamp = stamp
 
     def _load(self):
         if self.path.exists():
             self.data = json.loads(self.path.read_text(encoding="utf-8"))
         else:
             self.data = {}
-            self._save()
+        self._index()
+
+    def _index(self):
+        self.by_port = {port: slug for slug, port in self.data.items()}
+        self._free = [p for p in range(self.base, self.base + self.limit) if p not in self.by_port]
+        self._free_pos = {p: i for i, p in enumerate(self._free)}
+
+    def _take(self, port: int):
+        """Remove `port` from the free list in O(1) (swap with the last element)."""
+        i = self._free_pos.pop(port, None)
+        if i is None:
+            return
+        last = self._free.pop()
+        if last != port:
+            self._free[i] = last
+            self._free_pos[last] = i
+
+    def _give(self, port: int):
+        if self.base <= port < self.base + self.limit and port not in self._free_pos:
+            self._free_pos[port] = len(self._free)
+            self._free.append(port)
 
     def _save(self):
-        self.path.parent.mkdir(parents=True, exist_ok=True)
-        self.path.write_text(json.dumps(self.data, indent=2), encoding="utf-8")
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.data, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+        st = self.path.stat()
+        self._stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
 
     def _is_port_in_use(self, port: int) -> bool:
         """Check if a port is already in use on the system"""
@@ -29,28 +88,57 @@ class PortMap:
             except OSError:
                 return True
 
-    def assign(self, slug: str) -> int:
-        if slug in self.data:
-            # Check if previously assigned port is still free
-            port = self.data[slug]
-            if not self._is_port_in_use(port):
-                return port
-            # If in use, reassign
-            
-        # deterministic but spread: hash to a window
-        rng = random.Random(slug)
-        port = self.base + rng.randrange(self.limit)
-        
-        # avoid collisions with both our map AND system ports
-        max_attempts = 100
-        attempts = 0
-        while (port in self.data.values() or self._is_port_in_use(port)) and attempts < max_attempts:
-            port = self.base + rng.randrange(self.limit)
-            attempts += 1
-            
-        if attempts >= max_attempts:
-            raise RuntimeError(f"Could not find available port after {max_attempts} attempts")
-            
+    def _set(self, slug: str, port: int):
+        old = self.data.get(slug)
+        if old is not None and old != port:
+            self.by_port.pop(old, None)
+            self._give(old)
         self.data[slug] = port
+        self.by_port[port] = slug
+        self._take(port)
         self._save()
-        return port
+
+    def assign(self, slug: str, own_port: int = None) -> int:
+        """Port for `slug`. `own_port` is a port the slug's own running container is bound
+        to: it is kept (and recorded) without the in-use probe, which it would fail."""
+        with self._locked():
+            if own_port is not None and self.base <= own_port < self.base + self.limit \
+                    and self.by_port.get(own_port, slug) == slug:
+                if self.data.get(slug) != own_port:
+                    self._set(slug, own_port)
+                return own_port
+
+            if slug in self.data:
+                # Check if previously assigned port is still free
+                port = self.data[slug]
+                if not self._is_port_in_use(port):
+                    return port
+                # If in use, reassign
+
+            # deterministic but spread: try the slug's own spot in the window first
+            preferred = self.base + random.Random(slug).randrange(self.limit)
+            if preferred not in self.by_port and not self._is_port_in_use(preferred):
+                self._set(slug, preferred)
+                return preferred
+
+            # otherwise any free port; only ports busy outside our map cost extra probes
+            rng = random.Random()
+            max_attempts = 100
+            for _ in range(max_attempts):
+                if not self._free:
+                    break
+                port = self._free[rng.randrange(len(self._free))]
+                if not self._is_port_in_use(port):
+                    self._set(slug, port)
+                    return port
+            raise RuntimeError(f"Could not find available port after {max_attempts} attempts")
+
+    def release(self, slug: str):
+        """Forget a slug's assignment and return its port to the free list."""
+        with self._locked():
+            port = self.data.pop(slug, None)
+            if port is None:
+                return
+            self.by_port.pop(port, None)
+            self._give(port)
+            self._save()
@@ -0,0 +1,192 @@
+import random
+import re
+
+from mdx_sanitizer import sanitize_page
+
+
+# --- The pipeline sanitize_page replaced (app.py before the single-pass rewrite) ---
+
+def legacy_fix_mdx_curly_braces(content):
+    lines = content.split('\n')
+    result = []
+    in_code_block = False
+    in_frontmatter = False
+    frontmatter_count = 0
+
+    for line in lines:
+        if line.strip() == '---':
+            frontmatter_count += 1
+            if frontmatter_count <= 2:
+                in_frontmatter = True
+            if frontmatter_count == 2:
+                in_frontmatter = False
+            result.append(line)
+            continue
+
+        stripped = line.strip()
+        if 'code```' in stripped:
+            line = stripped.replace('code```', '```')
+            stripped = line.strip()
+        if re.search(r'\w```', stripped):
+            line = re.sub(r'(\w)(```)', r'\1\n\2', line)
+            stripped = line.strip()
+        if stripped.startswith('``') and not stripped.startswith('```'):
+            line = line.replace(stripped, '```')
+            stripped = '```'
+
+        if stripped.startswith('```'):
+            in_code_block = not in_code_block
+            result.append(line)
+            continue
+        if in_code_block or in_frontmatter:
+            result.append(line)
+            continue
+
+        inline_code_parts = []
+        def save_inline_code(match):
+            inline_code_parts.append(match.group(0))
+            return f"__INLINE_CODE_{len(inline_code_parts)-1}__"
+
+        def restore(text):
+            for idx, code in enumerate(inline_code_parts):
+                text = text.replace(f"__INLINE_CODE_{idx}__", code)
+            return text
+
+        modified_line = re.sub(r'`[^`]+`', save_inline_code, line)
+        modified_line = re.sub(r"\{[^}]*\}", "", modified_line)
+        modified_line = restore(modified_line.replace('{', '').replace('}', ''))
+
+        inline_code_parts = []
+        modified_line = re.sub(r'`[^`]+`', save_inline_code, modified_line)
+        modified_line = restore(re.sub(r':([a-zA-Z_][a-zA-Z0-9_]*)', r'\1', modified_line))
+
+        inline_code_parts = []
+        modified_line = re.sub(r'`[^`]+`', save_inline_code, modified_line)
+        modified_line = restore(re.sub(r'<([a-zA-Z][a-zA-Z0-9_-]*)>', r'\1', modified_line))
+
+        result.append(modified_line)
+
+    if in_code_block:
+        result.append('```')
+    return '\n'.join(result)
+
+
+def legacy_sanitize_yaml_frontmatter(content):
+    if not content.startswith("---"):
+        return content
+    lines = content.split("\n")
+    frontmatter_end = next((i for i in range(1, len(lines)) if lines[i].strip() == "---"), -1)
+    if frontmatter_end == -1:
+        return content
+    for i in range(1, frontmatter_end):
+        if ":" in lines[i]:
+            key, value = lines[i].split(":", 1)
+            value = re.sub(r'\*\*([^*]+)\*\*', r'\1', value)
+            value = re.sub(r'\*([^*]+)\*', r'\1', value)
+            value = re.sub(r'_([^_]+)_', r'\1', value)
+            value = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', value)
+            value = value.replace('`', '').replace('*', '')
+            lines[i] = f"{key}:{value}"
+    return "\n".join(lines)
+
+
+def legacy_sanitize(content, homepage=False):
+    content = legacy_sanitize_yaml_frontmatter(content)
+    content = legacy_fix_mdx_curly_braces(content)
+    if homepage and content.startswith("---"):
+        lines = content.split("\n")
+        frontmatter_end = next((i for i in range(1, len(lines)) if lines[i].strip() == "---"), -1)
+        if frontmatter_end > 0 and not any("slug:" in line for line in lines[1:frontmatter_end]):
+            lines.insert(frontmatter_end, "slug: /")
+            content = "\n".join(lines)
+    return content
+
+
+# --- Random pages that stay clear of the documented differences ---
+
+PROSE = ['word', 'The', 'route', '{id}', '{', '}', '{a {b} c}', ':param', '/users/:userId', '<token>',
+         '<YOUR_API_KEY>', '<a-b>', '**bold**', 'x:', 'a_b_c', '(see)', 'http://host', '#', '-', '|', '< b >']
+CODE_LINE = ['word', '`code`', '`{x}`', '`:id`', '`<a>`', ':param', '<token>', 'value:', '**b**', '|']
+FENCES = ['```', '```python', '  ```', '``', "``'", 'code```', '``js']
+CODE = ['def f():', '    return {"a": 1}', '<div>{x}</div>', 'GET /users/:id', '']
+FRONTMATTER = ['id: api', 'title: **API** _Reference_ [x](y) `z`', 'sidebar_position: 2', 'slug: /', 'tags: [a, b]']
+
+
+def random_page(rng):
+    lines = []
+    if rng.random() < 0.7:
+        lines.append('---')
+        lines += rng.sample(FRONTMATTER, rng.randint(0, len(FRONTMATTER)))
+        lines.append('---')
+    for _ in range(rng.randint(0, 25)):
+        kind = rng.random()
+        if kind < 0.1:
+            lines.append(rng.choice(FENCES))
+        elif kind < 0.25:
+            lines.append(rng.choice(CODE))
+        elif kind < 0.6:
+            # Braces never share a line with inline code (see test_braces_around_inline_code)
+            lines.append(' '.join(rng.choice(PROSE) for _ in range(rng.randint(0, 8))))
+        else:
+            lines.append(' '.join(rng.choice(CODE_LINE) for _ in range(rng.randint(0, 8))))
+    return '\n'.join(lines)
+
+
+def test_matches_legacy_pipeline_on_random_pages():
+    rng = random.Random(20)
+    for _ in range(5000):
+        page = random_page(rng)
+        homepage = rng.random() < 0.5
+        assert sanitize_page(page, homepage) == legacy_sanitize(page, homepage), page
+
+
+def test_matches_legacy_pipeline_on_benchmark_page():
+    from mdx_sanitizer import _bench_page
+    page = _bench_page(5)
+    # The benchmark page has 'Example:```python' lines; split them the way both pipelines agree on
+    page = page.replace('Example:```python', 'Example:\n```python')
+    assert sanitize_page(page, homepage=True) == legacy_sanitize(page, homepage=True)
+
+
+# --- Documented differences from the legacy pipeline ---
+
+def test_colon_before_inline_code_is_kept():
+    page = 'Call it like:`run()`'
+    assert sanitize_page(page) == 'Call it like:`run()`'
+    assert legacy_sanitize(page) == 'Call it like`run()`'
+
+
+def test_braces_around_inline_code():
+    page = 'Pass { `opts` } here'
+    assert sanitize_page(page) == 'Pass  `opts`  here'
+    assert legacy_sanitize(page) == 'Pass  here'
+
+
+def test_text_before_fence_opens_code_block():
+    page = 'Example```\n{x}\n```'
+    assert sanitize_page(page) == 'Example\n```\n{x}\n```'
+    assert legacy_sanitize(page) == 'Example\n```\n\n```\n```'
+
+
+def test_dashes_below_the_top_are_not_frontmatter():
+    page = 'no fm\n---\n{x}\n---\n'
+    assert sanitize_page(page) == 'no fm\n---\n\n---\n'
+    assert legacy_sanitize(page) == page
+
+
+# --- Behaviour ---
+
+def test_homepage_gets_slug_once():
+    page = '---\ntitle: **Home**\n---\n# Hi'
+    assert sanitize_page(page, homepage=True) == '---\ntitle: Home\nslug: /\n---\n# Hi'
+    with_slug = '---\nslug: /intro\n---\n'
+    assert sanitize_page(with_slug, homepage=True) == with_slug
+
+
+def test_code_blocks_are_untouched_and_closed():
+    page = 'Use {x}\n```js\nconst a = {b: 1}; // <tag> :param\n'
+    assert sanitize_page(page) == 'Use \n```js\nconst a = {b: 1}; // <tag> :param\n\n```'
+
+
+def test_unclosed_frontmatter_is_prose():
+    assert sanitize_page('---\ntitle: {x}') == '---\ntitle: '
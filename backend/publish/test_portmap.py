@@ -0,0 +1,96 @@
+import json
+import random
+
+import pytest
+
+from portmap import PortMap
+
+
+@pytest.fixture
+def free_ports(monkeypatch):
+    """Pretend nothing outside the map is listening; tests add ports to `busy`."""
+    busy = set()
+    monkeypatch.setattr(PortMap, "_is_port_in_use", lambda self, port: port in busy)
+    return busy
+
+
+def check_free_list(pm):
+    assert sorted(pm._free) == [p for p in range(pm.base, pm.base + pm.limit) if p not in pm.by_port]
+    assert pm._free_pos == {p: i for i, p in enumerate(pm._free)}
+    assert pm.by_port == {port: slug for slug, port in pm.data.items()}
+
+
+def test_take_and_give_keep_free_list_indexed(tmp_path):
+    pm = PortMap(tmp_path / "ports.json", base=100, limit=10)
+    with pm._locked():
+        for port in (100, 109, 104, 104, 200):
+            pm._take(port)
+        assert sorted(pm._free) == [101, 102, 103, 105, 106, 107, 108]
+        assert pm._free_pos == {p: i for i, p in enumerate(pm._free)}
+        for port in (109, 109, 100, 200):
+            pm._give(port)
+        assert sorted(pm._free) == [100, 101, 102, 103, 105, 106, 107, 108, 109]
+        assert pm._free_pos == {p: i for i, p in enumerate(pm._free)}
+
+
+def test_assign_prefers_slug_port_and_persists(tmp_path, free_ports):
+    path = tmp_path / "ports.json"
+    pm = PortMap(path, base=100, limit=50)
+    port = pm.assign("alpha")
+    assert port == 100 + random.Random("alpha").randrange(50)
+    assert pm.assign("alpha") == port
+    assert json.loads(path.read_text()) == {"alpha": port}
+    check_free_list(pm)
+
+
+def test_assign_skips_taken_and_busy_ports(tmp_path, free_ports):
+    pm = PortMap(tmp_path / "ports.json", base=100, limit=3)
+    ports = {pm.assign(slug) for slug in ("a", "b", "c")}
+    assert ports == {100, 101, 102}
+    check_free_list(pm)
+    with pytest.raises(RuntimeError):
+        pm.assign("d")
+
+
+def test_busy_assigned_port_is_reassigned(tmp_path, free_ports):
+    pm = PortMap(tmp_path / "ports.json", base=100, limit=20)
+    old = pm.assign("alpha")
+    free_ports.add(old)
+    new = pm.assign("alpha")
+    assert new != old
+    assert pm.data == {"alpha": new}
+    assert old in pm._free_pos
+    check_free_list(pm)
+
+
+def test_own_port_is_kept_without_probe(tmp_path, free_ports):
+    pm = PortMap(tmp_path / "ports.json", base=100, limit=20)
+    free_ports.update(range(100, 120))
+    assert pm.assign("alpha", own_port=107) == 107
+    assert pm.data == {"alpha": 107}
+    # Another slug's port is not ours to keep
+    free_ports.clear()
+    assert pm.assign("beta", own_port=107) != 107
+    check_free_list(pm)
+
+
+def test_release_returns_port(tmp_path, free_ports):
+    pm = PortMap(tmp_path / "ports.json", base=100, limit=20)
+    port = pm.assign("alpha")
+    pm.release("alpha")
+    pm.release("missing")
+    assert pm.data == {}
+    assert port in pm._free_pos
+    check_free_list(pm)
+
+
+def test_changes_are_seen_by_other_instances(tmp_path, free_ports):
+    path = tmp_path / "ports.json"
+    first, second = PortMap(path, base=100, limit=20), PortMap(path, base=100, limit=20)
+    port = first.assign("alpha")
+    assert second.assign("beta") != port
+    assert second.data["alpha"] == port
+    second.release("alpha")
+    first.assign("gamma")
+    assert set(first.data) == {"beta", "gamma"}
+    check_free_list(first)
@@ -0,0 +1,92 @@
+import json
+import os
+import tempfile
+
+# app.py creates its port map under SITES_ROOT on import
+os.environ.setdefault("SITES_ROOT", tempfile.mkdtemp(prefix="sites-"))
+
+import pytest
+
+import app
+from app import FilesStreamParser, page_input_hash, plan_pages, load_manifest, save_manifest
+
+
+FILES = [
+    {"path": "docs/intro.md", "content": "---\nid: intro\n---\nUse `{x}` and \"quotes\" }]"},
+    {"path": "docs/api.md", "content": "back\\slash \\\" { [ nested", "meta": {"tags": ["a", {"b": 1}]}},
+    {"path": "docs/empty.md", "content": ""},
+]
+DOCUMENT = 'Here you go:\n{"files": [' + ", ".join(json.dumps(f) for f in FILES) + "]}\ntrailing"
+
+
+def test_stream_parser_whole_document():
+    assert FilesStreamParser().feed(DOCUMENT) == FILES
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_stream_parser_any_chunking(size):
+    parser = FilesStreamParser()
+    out = []
+    for i in range(0, len(DOCUMENT), size):
+        out += parser.feed(DOCUMENT[i:i + size])
+    assert out == FILES
+    # Consumed input is dropped once no object is open
+    assert len(parser.text) <= size
+
+
+def test_stream_parser_emits_objects_as_they_close():
+    parser = FilesStreamParser()
+    first = json.dumps(FILES[0])
+    assert parser.feed('{"files": [' + first[:-1]) == []
+    assert parser.feed(first[-1] + ", ") == [FILES[0]]
+
+
+def test_stream_parser_ignores_other_nesting():
+    doc = '{"other": {"a": 1}, "files": [{"path": "p", "content": "c"}, [{"x": 1}]]}'
+    assert FilesStreamParser().feed(doc) == [{"path": "p", "content": "c"}]
+
+
+PAYLOAD = {"name": "Proj", "description": "d", "goal": "g", "dependencies": ["x"], "installation": []}
+
+
+def test_page_input_hash_stable_and_sensitive():
+    h = page_input_hash(PAYLOAD, "**Intro**", "Overview", 1)
+    assert h == page_input_hash(dict(PAYLOAD), "Intro", "Overview", 1)
+    assert h != page_input_hash(PAYLOAD, "Intro", "Overview!", 1)
+    assert h != page_input_hash(PAYLOAD, "Intro", "Overview", 2)
+    assert h != page_input_hash({**PAYLOAD, "goal": "other"}, "Intro", "Overview", 1)
+
+
+def test_manifest_round_trip(tmp_path):
+    assert load_manifest(tmp_path) == {"pages": {}, "built": None}
+    manifest = {"pages": {"intro": {"hash": "h"}}, "built": "s"}
+    save_manifest(tmp_path, manifest)
+    assert load_manifest(tmp_path) == manifest
+    (tmp_path / app.MANIFEST_NAME).write_text("{broken")
+    assert load_manifest(tmp_path) == {"pages": {}, "built": None}
+
+
+def test_plan_pages_reuses_unchanged_and_removes_the_rest(tmp_path):
+    pages = {"Intro": "Overview", "API Reference": "Endpoints"}
+    page_hashes, reuse = plan_pages(PAYLOAD, pages, tmp_path, {"pages": {}})
+    assert list(page_hashes) == ["intro", "api-reference"]
+    assert reuse == set()
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for slug in ("intro", "api-reference", "dropped"):
+        (docs / f"{slug}.md").write_text(slug)
+    manifest = {"pages": {slug: {"hash": h} for slug, h in page_hashes.items()}}
+
+    changed = {"Intro": "Overview", "API Reference": "Endpoints and errors"}
+    page_hashes, reuse = plan_pages(PAYLOAD, changed, tmp_path, manifest)
+    assert reuse == {"intro"}
+    # The changed page is removed so a failed regeneration can't serve the old one
+    assert sorted(p.name for p in docs.iterdir()) == ["intro.md"]
+
+
+def test_plan_pages_needs_the_doc_on_disk(tmp_path):
+    pages = {"Intro": "Overview"}
+    page_hashes, _ = plan_pages(PAYLOAD, pages, tmp_path, {"pages": {}})
+    manifest = {"pages": {slug: {"hash": h} for slug, h in page_hashes.items()}}
+    assert plan_pages(PAYLOAD, pages, tmp_path, manifest)[1] == set()
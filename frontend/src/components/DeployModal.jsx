@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import axios from 'axios';
+import { ingestRepo } from '@/lib/ingest';
 import { Button } from "./ui/button";
 import { Input } from "./ui/input";
 import { Card } from "./ui/card";
@@ -76,12 +76,9 @@ export const DeployModal = ({ isOpen, onClose }) => {
       try {
         setIngestLoading(true);
         setIngestError(null);
-        const resp = await axios.get("https://apihackutd.siru.dev/ingest", {
-          params: { repo_url: githubUrl.trim() },
-          signal: controller.signal,
-        });
-        console.log("Ingest response:", resp.data);
-        setIngestData(resp.data);
+        const result = await ingestRepo(githubUrl.trim(), { signal: controller.signal });
+        console.log("Ingest response:", result);
+        setIngestData(result);
         setIngestCompleted(true);
         // Clear the input so user can add another later
         setGithubUrl("");
@@ -0,0 +1,37 @@
+import axios from "axios";
+
+const API_BASE = "https://apihackutd.siru.dev";
+const POLL_INTERVAL_MS = 3000;
+
+const sleep = (ms, signal) =>
+  new Promise((resolve, reject) => {
+    if (signal?.aborted) {
+      reject(new axios.CanceledError());
+      return;
+    }
+    const onAbort = () => {
+      clearTimeout(timer);
+      reject(new axios.CanceledError());
+    };
+    const timer = setTimeout(() => {
+      signal?.removeEventListener("abort", onAbort);
+      resolve();
+    }, ms);
+    signal?.addEventListener("abort", onAbort, { once: true });
+  });
+
+// Queue an ingest job and poll /jobs/<id> until it finishes, resolving with the result document
+export async function ingestRepo(repoUrl, { signal, onProgress } = {}) {
+  const { data: queued } = await axios.get(`${API_BASE}/ingest`, {
+    params: { repo_url: repoUrl },
+    signal,
+  });
+
+  for (;;) {
+    await sleep(POLL_INTERVAL_MS, signal);
+    const { data: job } = await axios.get(`${API_BASE}/jobs/${queued.job_id}`, { signal });
+    onProgress?.(job);
+    if (job.status === "succeeded") return job.result;
+    if (job.status === "failed") throw new Error(job.error || "Failed to ingest repository");
+  }
+}
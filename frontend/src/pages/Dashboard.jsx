@@ -26,6 +26,8 @@ const SkeletonCard = () => {
   );
 };
 
+const REPOS_PAGE_SIZE = 1000;
+
 const Dashboard = () => {
   const [isLoading, setIsLoading] = useState(true);
   const [projects, setProjects] = useState([]);
@@ -36,8 +38,17 @@ const Dashboard = () => {
   useEffect(() => {
     const fetchProjects = async () => {
       try {
-        const response = await axios.get("https://apihackutd.siru.dev/repos");
-        const data = response.data;
+        // /repos is paged; keep fetching until we have X-Total-Count names
+        const data = [];
+        for (;;) {
+          const response = await axios.get("https://apihackutd.siru.dev/repos", {
+            params: { limit: REPOS_PAGE_SIZE, offset: data.length },
+          });
+          const page = Array.isArray(response.data) ? response.data : [];
+          data.push(...page);
+          const total = Number(response.headers["x-total-count"]);
+          if (page.length < REPOS_PAGE_SIZE || !(data.length < total)) break;
+        }
         // API returns an array of repo names, e.g., ["uhevents", "web", "hackutd-2025-proj"]
         const formattedProjects = Array.isArray(data)
           ? data.map((item) => {